@@ -0,0 +1,138 @@
+"""
+바코드 스캐너(키보드 입력 방식) 빠른 처리
+스캐너는 바코드를 아주 빠른 키 입력 + Enter로 보내므로, 키 간격과 접두사로 사람의 입력과 구분합니다.
+인식된 바코드는 로컬 색인(barcode -> 제품명, 층)으로 바로 찾아 Gemini 호출 없이 처리합니다.
+입고 스캔은 모아 두었다가 bulk_inventory.apply_bulk_restock으로 한 번에 더합니다.
+"""
+
+import time
+import uuid
+import threading
+import bulk_inventory
+from instrumentation import metrics
+
+SCAN_MAX_INTERVAL = 0.05  # 초. 스캐너는 보통 키 간격이 10~30ms
+MIN_BARCODE_LENGTH = 6
+RESTOCK_FLUSH_DELAY_MS = 800  # 마지막 입고 스캔 후 이 시간 동안 스캔이 없으면 반영
+RESTOCK_MAX_PENDING = 200  # 모인 입고 수량이 이만큼 되면 바로 반영
+
+
+class BarcodeIndex:
+    """barcodes 테이블 전체를 메모리에 올려 두고 스캔마다 DB 조회 없이 찾음"""
+
+    def __init__(self):
+        self._items = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def load(self, supabase) -> int:
+        response = supabase.table("barcodes").select("barcode, product_name, floor").execute()
+        self._items = {row["barcode"]: (row["product_name"], row.get("floor")) for row in response.data or []}
+        return len(self._items)
+
+    def clear(self):
+        self._items = {}
+
+    def lookup(self, barcode: str):
+        """(제품명, 층) 또는 None. 층이 정해지지 않은 바코드는 층이 None"""
+        return self._items.get(barcode)
+
+
+class ScanDetector:
+    """
+    입력창의 키 입력 시각을 기록해 두었다가, Enter가 눌렸을 때 입력 전체가 스캐너의 연속 입력인지 판단
+    prefix: 스캐너에 설정한 접두 문자. 지정하면 접두사가 있는 입력만 바코드로 인정
+    """
+
+    def __init__(self, prefix: str = "", max_interval: float = SCAN_MAX_INTERVAL, min_length: int = MIN_BARCODE_LENGTH):
+        self.prefix = prefix
+        self.max_interval = max_interval
+        self.min_length = min_length
+        self._times = []
+
+    def key(self, timestamp: float = None):
+        """문자 키 하나가 입력된 시각을 기록"""
+        self._times.append(time.monotonic() if timestamp is None else timestamp)
+
+    def reset(self):
+        self._times = []
+
+    def match(self, text: str):
+        """입력이 스캔이면 바코드 문자열을, 아니면 None을 반환"""
+        text = text.strip()
+        if self.prefix:
+            if not text.startswith(self.prefix):
+                return None
+            barcode = text[len(self.prefix):]
+        else:
+            barcode = text
+
+        if len(barcode) < self.min_length or not barcode.isalnum() or len(self._times) < len(text):
+            return None
+        # 입력 전체가 끊김 없이 빠르게 들어왔는지 확인 (사람이 입력한 뒤 붙여 넣은 경우 등 제외)
+        times = self._times[-len(text):]
+        if any(b - a > self.max_interval for a, b in zip(times, times[1:])):
+            return None
+        return barcode
+
+
+class RestockBatcher:
+    """
+    입고 스캔을 (제품명, 층)별로 모아 두었다가 한 번의 일괄 쓰기로 반영
+    쓰는 시점의 재고에 수량을 더하므로 그 사이 다른 키오스크의 차감을 덮어쓰지 않음
+    반영하지 못한 배치는 멱등 키와 함께 남겨 두었다가 같은 키로 다시 보내므로, 응답만 잃어버린 배치가 두 번 반영되지 않음
+    """
+
+    def __init__(self, max_pending: int = RESTOCK_MAX_PENDING):
+        self.max_pending = max_pending
+        self._pending = {}
+        self._retry = None  # (멱등 키, {(제품명, 층): 수량}) - 반영 여부를 알 수 없어 다시 보낼 배치
+        self._lock = threading.Lock()
+
+    @property
+    def pending_count(self) -> int:
+        with self._lock:
+            retry = sum(self._retry[1].values()) if self._retry else 0
+            return sum(self._pending.values()) + retry
+
+    def reset(self) -> int:
+        """
+        모인 스캔과 다시 보낼 배치를 모두 버리고 버린 수량을 반환 (로그아웃 시)
+        멱등 키는 사용자별이므로 다른 사용자로 다시 보내면 한 번 더 반영될 수 있음
+        """
+        with self._lock:
+            dropped = sum(self._pending.values()) + (sum(self._retry[1].values()) if self._retry else 0)
+            self._pending = {}
+            self._retry = None
+        return dropped
+
+    def add(self, product_name: str, floor: int, quantity: int = 1) -> bool:
+        """스캔 하나를 추가. 곧바로 반영해야 할 만큼 모였으면 True"""
+        with self._lock:
+            key = (product_name, floor)
+            self._pending[key] = self._pending.get(key, 0) + quantity
+            return sum(self._pending.values()) >= self.max_pending
+
+    def flush(self, supabase):
+        """
+        모인 입고를 반영하고 (diff, 반영된 행 수, 실패 목록)을 반환
+        이전에 반영하지 못한 배치가 있으면 같은 키로 그것부터 다시 보냄 (새 스캔은 다음 반영 때)
+        """
+        with self._lock:
+            if self._retry is None:
+                if not self._pending:
+                    return [], 0, []
+                self._retry, self._pending = (uuid.uuid4().hex, self._pending), {}
+            key, batch = self._retry
+
+        diff = [{"product_name": name, "floor": floor, "change": quantity, "after": None} for (name, floor), quantity in batch.items()]
+        applied, errors = bulk_inventory.apply_bulk_restock(supabase, diff, idempotency_key=key)
+
+        failed = {(e["product_name"], e["floor"]) for e in errors}
+        with self._lock:
+            remaining = {item: quantity for item, quantity in batch.items() if item in failed}
+            self._retry = (key, remaining) if remaining else None
+        metrics.incr("scan.restock_flushes")
+        metrics.incr("scan.restock_units", sum(q for item, q in batch.items() if item not in failed))
+        return [d for d in diff if (d["product_name"], d["floor"]) not in failed], applied, errors
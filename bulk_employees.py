@@ -0,0 +1,200 @@
+"""
+명단 파일을 이용한 임직원 일괄 등록
+인증 계정은 admin API로 동시에 생성하고, employees 테이블은 배치로 추가합니다.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from bulk_inventory import read_table_file
+
+EMAIL_DOMAIN = "company.test"
+ROSTER_COLUMN_ALIASES = {
+    "사번": "employee_id",
+    "이름": "name",
+    "비밀번호": "password",
+    "역할": "role",
+}
+VALID_ROLES = ("관리자", "일반", "")
+MAX_WORKERS = 8
+INSERT_BATCH_SIZE = 100
+
+
+def employee_email(employee_id: str) -> str:
+    return f"{employee_id}@{EMAIL_DOMAIN}"
+
+
+def read_roster_file(path: str) -> pd.DataFrame:
+    df = read_table_file(path)
+    df.columns = [ROSTER_COLUMN_ALIASES.get(c, c) for c in df.columns]
+    return df
+
+
+def validate_roster_rows(df: pd.DataFrame):
+    """
+    명단의 각 행을 검증
+    반환: (rows, errors) - rows는 [{"employee_id", "name", "password", "role"}]
+    """
+    missing = [c for c in ("employee_id", "name", "password") if c not in df.columns]
+    if missing:
+        raise ValueError(f"필수 컬럼이 없습니다: {', '.join(missing)}")
+    if "role" not in df.columns:
+        df = df.assign(role="")
+
+    rows = []
+    errors = []
+    seen = set()
+    for row_no, record in enumerate(df.fillna("").to_dict("records"), start=2):
+        employee_id = str(record["employee_id"]).strip().upper()
+        name = str(record["name"]).strip()
+        password = str(record["password"])
+        role = str(record["role"]).strip()
+
+        if not all([employee_id, name, password]):
+            errors.append({"row": row_no, "employee_id": employee_id, "reason": "사번, 이름, 비밀번호는 필수"})
+            continue
+        if len(password) < 6:
+            errors.append({"row": row_no, "employee_id": employee_id, "reason": "비밀번호는 6자 이상이어야 함"})
+            continue
+        if role not in VALID_ROLES:
+            errors.append({"row": row_no, "employee_id": employee_id, "reason": f"알 수 없는 역할 ({role})"})
+            continue
+        if employee_id in seen:
+            errors.append({"row": row_no, "employee_id": employee_id, "reason": "명단 내 중복 사번"})
+            continue
+
+        seen.add(employee_id)
+        rows.append({"row": row_no, "employee_id": employee_id, "name": name, "password": password, "role": role})
+    return rows, errors
+
+
+def _create_auth_user(admin_supabase, row: dict):
+    """인증 계정 하나를 생성하고 (row, auth_user_id, 오류)를 반환"""
+    try:
+        response = admin_supabase.auth.admin.create_user({
+            "email": employee_email(row["employee_id"]),
+            "password": row["password"],
+            "email_confirm": True,
+        })
+        return row, response.user.id, None
+    except Exception as e:
+        return row, None, e
+
+
+def _delete_auth_user(admin_supabase, auth_user_id: str):
+    try:
+        admin_supabase.auth.admin.delete_user(auth_user_id)
+        return None
+    except Exception as e:
+        return e
+
+
+def _employee_record(row: dict, auth_user_id: str) -> dict:
+    return {
+        "employee_id": row["employee_id"],
+        "name": row["name"],
+        "role": row["role"],
+        "auth_user_id": auth_user_id,
+    }
+
+
+def provision_employees(supabase, admin_supabase, rows: list,
+                        max_workers: int = MAX_WORKERS, batch_size: int = INSERT_BATCH_SIZE) -> dict:
+    """
+    임직원을 일괄 등록하고 결과 보고서를 반환
+    employees 추가에 실패한 임직원의 인증 계정은 삭제하여 고아 계정이 남지 않게 합니다.
+    """
+    started = time.perf_counter()
+    failures = []
+    created = []
+
+    # 1. 인증 계정 동시 생성 (admin API 호출 수를 max_workers로 제한)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for row, auth_user_id, error in executor.map(lambda r: _create_auth_user(admin_supabase, r), rows):
+            if error:
+                failures.append({"row": row["row"], "employee_id": row["employee_id"], "reason": f"인증 계정 생성 실패: {error}"})
+            else:
+                created.append((row, auth_user_id))
+
+    # 2. employees 배치 추가. 배치가 실패하면 한 명씩 다시 추가하여, 실제로 실패한 사람의 인증 계정만 롤백
+    inserted = 0
+    rolled_back = 0
+    for start in range(0, len(created), batch_size):
+        batch = created[start:start + batch_size]
+        try:
+            supabase.table("employees").insert([_employee_record(row, auth_user_id) for row, auth_user_id in batch]).execute()
+            inserted += len(batch)
+            continue
+        except Exception as e:
+            batch_error = e
+
+        failed = []
+        if len(batch) == 1:
+            failed.append((batch[0], batch_error))
+        else:
+            for row, auth_user_id in batch:
+                try:
+                    supabase.table("employees").insert(_employee_record(row, auth_user_id)).execute()
+                    inserted += 1
+                except Exception as e:
+                    failed.append(((row, auth_user_id), e))
+        if not failed:
+            continue
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            delete_errors = list(executor.map(lambda item: _delete_auth_user(admin_supabase, item[0][1]), failed))
+        for ((row, auth_user_id), insert_error), delete_error in zip(failed, delete_errors):
+            reason = f"임직원 정보 추가 실패: {insert_error}"
+            if delete_error:
+                reason += f" / 인증 계정({auth_user_id}) 삭제 실패, 수동 삭제 필요: {delete_error}"
+            else:
+                rolled_back += 1
+            failures.append({"row": row["row"], "employee_id": row["employee_id"], "reason": reason})
+
+    elapsed = time.perf_counter() - started
+    return {
+        "requested": len(rows),
+        "inserted": inserted,
+        "rolled_back": rolled_back,
+        "failures": sorted(failures, key=lambda f: f["row"]),
+        "elapsed": elapsed,
+        "throughput": inserted / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def add_employee(supabase, admin_supabase, employee_id: str, name: str, password: str, role: str = "") -> str:
+    """
+    임직원 한 명을 등록하고 결과 메시지를 반환 (일괄 등록과 같은 경로: admin API로 계정 생성, 실패 시 롤백)
+    로그인한 클라이언트로 가입(sign_up)하지 않으므로 현재 세션이 바뀌지 않음. 실패하면 ValueError
+    """
+    row = {"row": 1, "employee_id": str(employee_id or "").strip().upper(), "name": name, "password": password, "role": role or ""}
+    if not all([row["employee_id"], row["name"], row["password"]]):
+        raise ValueError("사번, 이름, 비밀번호는 필수입니다.")
+    if row["role"] not in VALID_ROLES:
+        raise ValueError(f"알 수 없는 역할 ({row['role']})")
+
+    report = provision_employees(supabase, admin_supabase, [row])
+    if not report["inserted"]:
+        raise ValueError(report["failures"][0]["reason"])
+    return f"임직원 '{row['employee_id']}'({row['name']})을(를) 등록했습니다."
+
+
+def delete_employee(supabase, admin_supabase, employee_id: str = None, name: str = None) -> str:
+    """
+    임직원 한 명의 인증 계정과 employees 정보를 삭제하고 결과 메시지를 반환
+    찾지 못하면 ValueError
+    """
+    query = supabase.table("employees").select("employee_id, auth_user_id")
+    query = query.eq("employee_id", employee_id) if employee_id else query.eq("name", name)
+    response = query.execute()
+    if not response.data:
+        raise ValueError("해당 임직원을 찾을 수 없습니다.")
+
+    target = response.data[0]
+    if target.get("auth_user_id"):
+        admin_supabase.auth.admin.delete_user(target["auth_user_id"])
+    supabase.table("employees").delete().eq("employee_id", target["employee_id"]).execute()
+
+    if not target.get("auth_user_id"):
+        return f"인증 계정 정보가 없어 employees 테이블에서만 '{target['employee_id']}'을(를) 삭제했습니다."
+    return f"임직원 '{target['employee_id']}'을(를) 삭제했습니다."
@@ -0,0 +1,223 @@
+"""
+CSV/Excel 파일을 이용한 재고 일괄 입고 및 내보내기
+"""
+
+import os
+import re
+import math
+import time
+import uuid
+import unicodedata
+import pandas as pd
+from command_engine import add_stock, is_transient_error, is_missing_function, MAX_WRITE_ATTEMPTS, WRITE_RETRY_BACKOFF
+from session_refresher import is_session_expired
+from instrumentation import metrics
+
+# 파일 컬럼명 -> inventory 컬럼명
+COLUMN_ALIASES = {
+    "제품명": "product_name",
+    "name": "product_name",
+    "층": "floor",
+    "수량": "quantity",
+}
+REQUIRED_COLUMNS = ["product_name", "floor", "quantity"]
+RESTOCK_BATCH_SIZE = 500  # RPC 한 번에 보내는 행 수
+
+
+def normalize_product_name(name) -> str:
+    """제품명 정규화: 전각/반각 통일(NFKC) 후 모든 공백 제거 ("몽쉘 코코아" -> "몽쉘코코아")"""
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", str(name)))
+
+
+def read_table_file(path: str) -> pd.DataFrame:
+    """확장자에 따라 CSV 또는 Excel 파일을 읽어 DataFrame으로 반환"""
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext == ".csv":
+            # 엑셀에서 저장한 CSV는 BOM이 붙는 경우가 많음
+            df = pd.read_csv(path, encoding="utf-8-sig", dtype=str)
+        elif ext in (".xlsx", ".xls"):
+            df = pd.read_excel(path, dtype=str)
+        else:
+            raise ValueError(f"지원하지 않는 파일 형식입니다: {ext} (csv, xlsx만 가능)")
+    except ImportError as e:
+        raise ValueError(f"Excel 파일을 읽으려면 openpyxl 패키지가 필요합니다: {e}")
+
+    df.columns = [COLUMN_ALIASES.get(str(c).strip(), str(c).strip()) for c in df.columns]
+    return df
+
+
+def write_table_file(df: pd.DataFrame, path: str):
+    """확장자에 따라 CSV 또는 Excel 파일로 저장"""
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext in (".xlsx", ".xls"):
+            df.to_excel(path, index=False)
+        else:
+            df.to_csv(path, index=False, encoding="utf-8-sig")
+    except ImportError as e:
+        raise ValueError(f"Excel 파일로 저장하려면 openpyxl 패키지가 필요합니다: {e}")
+
+
+def validate_restock_rows(df: pd.DataFrame):
+    """
+    입고 파일의 각 행을 검증/정규화
+    반환: (rows, errors)
+      rows   - (product_name, floor) 기준으로 합산된 [{"product_name", "floor", "quantity"}]
+      errors - [{"row": 파일 행 번호, "reason": 사유}]
+    """
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"필수 컬럼이 없습니다: {', '.join(missing)}")
+
+    merged = {}
+    errors = []
+    # 헤더가 1행이므로 데이터는 2행부터
+    for row_no, record in enumerate(df[REQUIRED_COLUMNS].to_dict("records"), start=2):
+        raw_name = record["product_name"]
+        if pd.isna(raw_name) or not str(raw_name).strip():
+            errors.append({"row": row_no, "reason": "제품명 누락"})
+            continue
+        product_name = normalize_product_name(raw_name)
+
+        try:
+            floor = float(str(record["floor"]).replace("층", "").strip())
+            quantity = float(str(record["quantity"]).replace("개", "").strip())
+            if not (math.isfinite(floor) and math.isfinite(quantity)):
+                raise ValueError
+        except (TypeError, ValueError):
+            errors.append({"row": row_no, "product_name": product_name, "reason": "층 또는 수량이 숫자가 아님"})
+            continue
+        # 2.7처럼 소수인 값은 잘라 내지 않고 오류로 보고
+        if not (floor.is_integer() and quantity.is_integer()):
+            errors.append({"row": row_no, "product_name": product_name, "reason": f"층 또는 수량이 정수가 아님 ({record['floor']}, {record['quantity']})"})
+            continue
+        floor, quantity = int(floor), int(quantity)
+
+        if floor <= 0:
+            errors.append({"row": row_no, "product_name": product_name, "reason": f"잘못된 층 ({floor})"})
+            continue
+        if quantity <= 0:
+            errors.append({"row": row_no, "product_name": product_name, "reason": f"수량은 1 이상이어야 함 ({quantity})"})
+            continue
+
+        key = (product_name, floor)
+        merged[key] = merged.get(key, 0) + quantity
+
+    rows = [{"product_name": name, "floor": floor, "quantity": qty} for (name, floor), qty in merged.items()]
+    return rows, errors
+
+
+def fetch_inventory(supabase) -> list:
+    """현재 inventory 전체 스냅샷을 한 번의 쿼리로 조회"""
+    response = supabase.table("inventory").select("product_name, floor, quantity").order("floor").order("product_name").execute()
+    return response.data or []
+
+
+def build_restock_diff(supabase, rows: list) -> list:
+    """
+    DB에 쓰지 않고 입고 결과를 미리 계산 (dry-run)
+    파일의 제품명은 공백을 무시하고 기존 제품명과 매칭하여 DB 표기를 따름
+    """
+    current = {}
+    canonical = {}
+    for item in fetch_inventory(supabase):
+        current[(item["product_name"], item["floor"])] = item["quantity"]
+        canonical[(normalize_product_name(item["product_name"]), item["floor"])] = item["product_name"]
+
+    diff = []
+    for row in rows:
+        floor = row["floor"]
+        product_name = canonical.get((row["product_name"], floor), row["product_name"])
+        before = current.get((product_name, floor))
+        diff.append({
+            "product_name": product_name,
+            "floor": floor,
+            "before": before or 0,
+            "change": row["quantity"],
+            "after": (before or 0) + row["quantity"],
+            "is_new": before is None,
+        })
+    return diff
+
+
+def apply_bulk_restock(supabase, diff: list, batch_size: int = RESTOCK_BATCH_SIZE, idempotency_key: str = None):
+    """
+    build_restock_diff 결과의 입고 수량(change)을 일괄 반영
+    미리보기의 after가 아니라 쓰는 시점의 재고에 더하므로(query.md의 apply_restock_batch RPC),
+    미리보기 이후 다른 키오스크에서 차감한 수량도 그대로 보존됨
+    배치마다 "멱등 키:순번" 키를 붙여, 응답을 받지 못한 배치는 같은 키로 다시 보냄
+    세션 만료 오류는 그대로 올려 보내므로, 같은 idempotency_key로 다시 호출하면 이미 반영된 배치는 한 번만 반영됨
+    반영된 항목의 after는 실제 반영 후 수량으로 바뀜
+    반환: (반영된 행 수, 실패 목록)
+    """
+    base_key = idempotency_key or uuid.uuid4().hex
+    use_rpc = True
+    applied = 0
+    errors = []
+    for index, start in enumerate(range(0, len(diff), batch_size)):
+        batch = diff[start:start + batch_size]
+        try:
+            if use_rpc:
+                rows = _apply_restock_batch(supabase, f"{base_key}:{index}", batch)
+                if rows is None:
+                    use_rpc = False
+            if not use_rpc:
+                rows = _add_restock_rows(supabase, batch)
+        except Exception as e:
+            # 세션 만료는 호출한 쪽(SessionRefresher.call)이 갱신 후 같은 키로 다시 실행하도록 넘김
+            if is_session_expired(e):
+                raise
+            for d in batch:
+                errors.append({"product_name": d["product_name"], "floor": d["floor"], "reason": f"DB 오류: {e}"})
+            continue
+
+        after = {(row["product_name"], row["floor"]): row["quantity"] for row in rows}
+        for d in batch:
+            key = (d["product_name"], d["floor"])
+            if key in after:
+                d["after"] = after[key]
+                applied += 1
+            else:
+                errors.append({"product_name": d["product_name"], "floor": d["floor"], "reason": "다른 사용자와 동시에 변경되어 처리하지 못했습니다."})
+    return applied, errors
+
+
+def _apply_restock_batch(supabase, key: str, batch: list):
+    """배치 하나를 RPC로 반영하고 반영 후 행 목록을 반환. RPC가 없는 DB면 None"""
+    params = {
+        "p_key": key,
+        "p_rows": [{"product_name": d["product_name"], "floor": d["floor"], "quantity": d["change"]} for d in batch],
+    }
+    for attempt in range(MAX_WRITE_ATTEMPTS):
+        try:
+            outcome = supabase.rpc("apply_restock_batch", params).execute().data
+            break
+        except Exception as e:
+            if is_missing_function(e):
+                return None
+            if not is_transient_error(e) or attempt == MAX_WRITE_ATTEMPTS - 1:
+                raise
+            metrics.incr("engine.write_retries")
+            time.sleep(WRITE_RETRY_BACKOFF * (attempt + 1))
+    if outcome.get("replayed"):
+        metrics.incr("engine.idempotent_replays")
+    return outcome.get("rows") or []
+
+
+def _add_restock_rows(supabase, batch: list) -> list:
+    """RPC가 없는 DB용: 행마다 compare-and-set으로 더함 (멱등 보장 없음)"""
+    rows = []
+    for d in batch:
+        quantity = add_stock(supabase, d["product_name"], d["floor"], d["change"])
+        if quantity is not None:
+            rows.append({"product_name": d["product_name"], "floor": d["floor"], "quantity": quantity})
+    return rows
+
+
+def export_inventory(supabase, path: str) -> int:
+    """현재 inventory 스냅샷을 CSV/Excel로 내보내고 행 수를 반환"""
+    data = fetch_inventory(supabase)
+    df = pd.DataFrame(data, columns=REQUIRED_COLUMNS)
+    write_table_file(df, path)
+    return len(df)
@@ -1,32 +1,70 @@
 import os
+import sys
 import json
+import time
 import tomllib
+import argparse
+import getpass
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
 from supabase_auth.types import Session
-
-def start_cli(user_session: Session):
-    """인증된 세션을 기반으로 대화형 CLI를 시작합니다."""
-
-    try:
+import bulk_employees
+import settlement_report
+from command_engine import CommandEngine, build_system_prompt
+from stock_alerts import load_monitor
+
+BATCH_PARSE_WORKERS = 4
+
+
+def load_config(base_path: str) -> dict:
+    """supabase.json 로드"""
+    supabase_json_path = os.path.join(base_path, 'supabase.json')
+    with open(supabase_json_path, 'r') as f:
+        config = json.load(f)
+
+    if not all([config.get("URL"), config.get("API"), config.get("GEMINI_API_KEY"), config.get("SERVICE_ROLE_API")]):
+        raise ValueError("supabase.json에 URL, API, GEMINI_API_KEY, SERVICE_ROLE_API가 모두 필요합니다.")
+    return config
+
+
+def format_event(event: dict) -> list:
+    """CommandEngine 이벤트를 CLI에 출력할 줄 목록으로 변환"""
+    event_type = event.get("type")
+    if event_type in ("reply", "system"):
+        return str(event["text"]).splitlines()
+    if event_type == "error":
+        return [f"오류: {line}" for line in str(event["text"]).splitlines()]
+    if event_type == "alert":
+        return [f"[재고 부족] {event['floor']}층 {event['product_name']} 남은 수량 {event['quantity']}개 (기준 {event['threshold']}개)"]
+    if event_type == "table":
+        if not event["data"]:
+            return ["(기록 없음)"]
+        if event["kind"] == "show_purchase_logs":
+            return [f"  - 일시: {log.get('created_at_kst', log.get('created_at'))}, 사용자: {log['employee_id']}, 품목ID: {log['item_id']}, "
+                    f"제품: {log['product_name']}, 수량: {log['quantity']}개" for log in event["data"]]
+        return [f"  - {employee['employee_id']} {employee['name']} ({employee.get('role') or '일반'})" for employee in event["data"]]
+    # "refresh"는 다시 그릴 재고 표가 없으므로 출력하지 않음
+    return []
+
+
+class CliSession:
+    """
+    인증된 세션 하나에 대한 Supabase/Gemini 클라이언트와 사용자 정보
+    명령은 GUI/공유 서비스와 같은 CommandEngine으로 처리하고 (대화 상태, 작업 최적화, 재고 부족 알림 공유),
+    화면에 따라 달라지는 작업(재고 목록 출력, 임직원 관리, 정산 보고서)만 handlers로 처리합니다.
+    """
+
+    def __init__(self, user_session: Session, interactive: bool = True):
         base_path = os.path.dirname(os.path.abspath(__file__))
-        
-        #supabase.json 로드
-        supabase_json_path = os.path.join(base_path, 'supabase.json')
-        with open(supabase_json_path, 'r') as f:
-            config = json.load(f)
-            url: str = config.get("URL")
-            key: str = config.get("API")
-            gemini_api_key: str = config.get("GEMINI_API_KEY")
-            service_role_key: str = config.get("SERVICE_ROLE_API")
-        
-        if not all([url, key, gemini_api_key, service_role_key]):
-            raise ValueError("supabase.json에 URL, API, GEMINI_API_KEY, SERVICE_ROLE_API가 모두 필요합니다.")
-        
-         # prompts.toml 로드
-        prompts_toml_path = os.path.join(base_path, 'prompts.toml')
-
-        with open(prompts_toml_path, "rb") as f:
+        config = load_config(base_path)
+        self.url: str = config.get("URL")
+        self.service_role_key: str = config.get("SERVICE_ROLE_API")
+        self.interactive = interactive
+        self._admin_supabase = None
+
+        # prompts.toml 로드
+        with open(os.path.join(base_path, 'prompts.toml'), "rb") as f:
             cfg = tomllib.load(f)
 
         base_prompt_str   = cfg["base_prompt"]
@@ -36,44 +74,151 @@ def start_cli(user_session: Session):
         if not all([base_prompt_str, admin_actions_str, common_actions_str]):
             raise ValueError("prompts.toml 파일에 필요한 프롬프트 섹션이 누락되었습니다.")
 
-        supabase: Client = create_client(url, key)
-        genai.configure(api_key=gemini_api_key)
-        model = genai.GenerativeModel(model_name='gemini-2.0-flash')
+        self.supabase: Client = create_client(self.url, config.get("API"))
+        genai.configure(api_key=config.get("GEMINI_API_KEY"))
+        self.model = genai.GenerativeModel(model_name='gemini-2.0-flash')
+
+        self.supabase.auth.set_session(user_session.session.access_token, user_session.session.refresh_token)
+
+        # --- 1. 사용자 역할 확인 ---
+        self.user_email = user_session.user.email
+        self.employee_id = self.user_email.split('@')[0].upper()
+        self.is_admin = self.supabase.rpc('get_my_role').execute().data == '관리자'
+
+        # --- 2. 역할에 따른 시스템 프롬프트 동적 생성 ---
+        self.system_prompt = build_system_prompt(cfg, self.is_admin)
+        self.engine = CommandEngine(self.supabase, self.model, self.employee_id, self.is_admin, self.system_prompt)
+        self.engine.stock_monitor = load_monitor(os.path.join(base_path, 'alerts.toml'), base_path)
+
+    def get_admin_client(self) -> Client:
+        """임직원 관리용 service role 클라이언트 (처음 필요할 때 생성)"""
+        if self._admin_supabase is None:
+            self._admin_supabase = create_client(self.url, self.service_role_key)
+        return self._admin_supabase
+
+    def parse(self, command: str):
+        """Gemini로 자연어 명령을 작업 목록으로 변환. 반환: (tasks, response_text) - 질문이면 tasks는 None"""
+        return self.engine.parse(command)
+
+    def run(self, command: str, emit, tasks: list = None, narrate: bool = True):
+        """명령 하나를 CommandEngine으로 처리. 결과는 emit(event)로 전달"""
+        self.engine.run(command, emit, tasks=tasks, handlers=self.handlers(emit), narrate=narrate)
+
+    def handlers(self, emit) -> dict:
+        """엔진 대신 CLI에서 실행하는 작업"""
+
+        def query_all(task):
+            response = self.supabase.table("inventory").select("product_name, quantity, floor").order("floor").order("product_name").execute()
+            if not response.data:
+                emit({"type": "system", "text": "재고가 비어있습니다."})
+                return None
+            lines = [f"  - {product['floor']}층 {product['product_name']}: {product['quantity']}개" for product in response.data]
+            emit({"type": "system", "text": "현재 재고:\n" + "\n".join(lines)})
+            for alert in self.engine.stock_monitor.seed(response.data):
+                emit({"type": "alert", **alert})
+            return None
+
+        def add_employee(task):
+            payload = task.get("payload", {})
+            employee_id = str(payload.get("employee_id", "")).strip().upper()
+            try:
+                message = bulk_employees.add_employee(self.supabase, self.get_admin_client(), employee_id,
+                                                      payload.get("name"), payload.get("password"), payload.get("role", ""))
+                return {"action": "add_employee", "employee_id": employee_id, "name": payload.get("name"), "status": "success", "message": message}
+            except Exception as e:
+                return {"action": "add_employee", "employee_id": employee_id, "status": "fail", "reason": str(e)}
 
-    except Exception as e:
-        print(f"초기화 오류: {e}")
-        return
+        def delete_employee(task):
+            payload = task.get("payload", {})
+            employee_id, name = payload.get("employee_id"), payload.get("name")
+            if not employee_id and not name:
+                return {"action": "delete_employee", "status": "fail", "reason": "사번 또는 이름은 필수입니다."}
+            try:
+                message = bulk_employees.delete_employee(self.supabase, self.get_admin_client(), employee_id, name)
+                return {"action": "delete_employee", "employee_id": employee_id, "name": name, "status": "success", "message": message}
+            except Exception as e:
+                return {"action": "delete_employee", "employee_id": employee_id, "name": name, "status": "fail", "reason": str(e)}
 
-    supabase.auth.set_session(user_session.session.access_token, user_session.session.refresh_token)
+        def bulk_add_employees(task):
+            roster_path = task.get("payload", {}).get("path")
+            if not roster_path and self.interactive:
+                roster_path = input("  명단 파일 경로 (csv/xlsx): ").strip()
+            if not roster_path:
+                emit({"type": "error", "text": "명단 파일 경로가 필요합니다."})
+                return None
+
+            try:
+                df = bulk_employees.read_roster_file(roster_path)
+                rows, row_errors = bulk_employees.validate_roster_rows(df)
+            except Exception as e:
+                emit({"type": "error", "text": f"명단 파일을 읽지 못했습니다: {e}"})
+                return None
+
+            report = bulk_employees.provision_employees(self.supabase, self.get_admin_client(), rows)
+            failures = row_errors + report["failures"]
+            lines = [f"  - {failure['row']}행 ({failure['employee_id']}): {failure['reason']}" for failure in failures]
+            message = (f"완료! {report['inserted']}/{report['requested']}명 등록, "
+                       f"{len(failures)}건 실패 (롤백 {report['rolled_back']}건), "
+                       f"{report['elapsed']:.1f}초 ({report['throughput']:.1f}명/초)")
+            emit({"type": "system", "text": "\n".join([message] + lines)})
+            return None
+
+        def settlement(task):
+            payload = task.get("payload", {})
+            try:
+                start, end = settlement_report.resolve_period(payload)
+            except ValueError as e:
+                emit({"type": "error", "text": str(e)})
+                return None
+
+            report_path = payload.get("path")
+            if not report_path and self.interactive:
+                report_path = input(f"  저장할 파일 경로 (csv/xlsx, 기본 settlement_{start:%Y-%m}.csv): ").strip()
+            report_path = report_path or f"settlement_{start:%Y-%m}.csv"
+
+            try:
+                report = settlement_report.build_settlement(self.supabase, start, end)
+                settlement_report.write_settlement(report, report_path)
+            except Exception as e:
+                emit({"type": "error", "text": f"정산 보고서 생성 중 오류 발생: {e}"})
+                return None
+
+            total = report["total"]
+            top = sorted(report["by_employee"].items(), key=lambda item: -item[1]["quantity"])[:10]
+            lines = [f"  - {employee_id} {report['names'].get(employee_id, '')}: {entry['count']}건, {entry['quantity']}개" for employee_id, entry in top]
+            message = (f"완료! {settlement_report.period_label(report)} 정산: 직원 {len(report['by_employee'])}명, "
+                       f"{total['count']}건, 총 {total['quantity']}개 -> {report_path}")
+            emit({"type": "system", "text": "\n".join([message] + lines)})
+            return None
+
+        return {
+            "query_all": query_all,
+            "add_employee": add_employee,
+            "delete_employee": delete_employee,
+            "bulk_add_employees": bulk_add_employees,
+            "settlement_report": settlement,
+        }
+
+
+def start_cli(user_session: Session):
+    """인증된 세션을 기반으로 대화형 CLI를 시작합니다."""
 
-    # --- 1. 사용자 역할 확인 ---
-    is_admin = False
-    user_email = user_session.user.email
-    employee_id = user_email.split('@')[0]
-    
     try:
-        response = supabase.rpc('get_my_role').execute()
-        user_role = response.data
-        if user_role == '관리자':
-            is_admin = True
+        session = CliSession(user_session)
     except Exception as e:
-        print(f"사용자 역할 확인 중 오류 발생: {e}")
+        print(f"초기화 오류: {e}")
         return
 
-    # --- 2. 역할에 따른 시스템 프롬프트 동적 생성 ---
-    system_prompt = base_prompt_str
-    if is_admin:
-        system_prompt += admin_actions_str + common_actions_str.replace("- 'decrement'", "4. 'decrement'")
-    else:
-        system_prompt += common_actions_str.replace("- 'decrement'", "1. 'decrement'")
-
-
     print("\n========================================")
     print(" 디저트 재고 관리 CLI (MCP)에 오신 것을 환영합니다!")
-    print(f" 로그인된 사용자: {user_email} ({ '관리자' if is_admin else '일반'})")
+    print(f" 로그인된 사용자: {session.user_email} ({ '관리자' if session.is_admin else '일반'})")
     print("========================================")
     print("명령을 입력하세요. (종료하려면 'exit' 또는 Ctrl+C 입력)")
 
+    def show(event):
+        for line in format_event(event):
+            print(f"  -> {line}" if not line.startswith("  ") else f"  {line}")
+
     while True:
         try:
             command = input("> ").strip()
@@ -81,257 +226,108 @@ def start_cli(user_session: Session):
                 break
             if not command:
                 continue
-
-            full_prompt = system_prompt + "\n사용자 요청: " + command
-            gemini_response = model.generate_content(full_prompt)
-            
-            response_text = gemini_response.text.strip()
-            # Gemini 응답에서 Markdown 코드 블록 마커 제거
-            if response_text.startswith('```json'):
-                response_text = response_text.lstrip('```json').strip()
-            if response_text.endswith('```'):
-                response_text = response_text.rstrip('```').strip()
-
-            # JSON 파싱 로직 개선: 단일 객체 또는 배열 처리
-            tasks_to_execute = []
-            try:
-                # 응답이 배열 형태일 경우
-                if response_text.startswith('['):
-                    tasks_to_execute = json.loads(response_text)
-                # 응답이 단일 객체 형태일 경우
-                elif response_text.startswith('{'):
-                    tasks_to_execute = [json.loads(response_text)]
-                else:
-                    # Gemini가 여러 객체를 배열 없이 반환한 경우 (예: }{)를 처리
-                    # 이 부분은 Gemini가 프롬프트 지시를 따르지 않을 때의 방어 로직
-                    fixed_text = f"[{response_text.replace('}{', ',')}]"
-                    tasks_to_execute = json.loads(fixed_text)
-
-            except json.JSONDecodeError:
-                print("오류: Gemini가 보낸 응답이 올바른 JSON 형식이 아닙니다.")
-                print("받은 내용:", response_text)
-                continue
-            except Exception as e:
-                print(f"JSON 파싱 중 알 수 없는 오류: {e}")
-                print("받은 내용:", response_text)
-                continue
-
-            # 각 작업을 순서대로 실행
-            for task in tasks_to_execute:
-                action = task.get("action")
-                payload = task.get("payload", {})
-
-                if action in ["query_all", "query_one", "increment", "show_purchase_logs", "delete_item", "add_employee", "delete_employee"] and not is_admin:
-                    print("  -> 오류: 이 명령을 실행할 권한이 없습니다.")
-                    continue
-
-                if action == "query_all":
-                    data, count = supabase.table("inventory").select("product_name, quantity").execute()
-                    if not data[1]:
-                        print("  -> 재고가 비어있습니다.")
-                    else:
-                        print("  -> 현재 재고:")
-                        for product in data[1]:
-                            print(f"    - {product['product_name']}: {product['quantity']}개")
-
-                elif action == "decrement":
-                    product_name = payload.get("name")
-                    change_quantity = payload.get("quantity", 0)
-                    if not product_name or change_quantity <= 0:
-                        print("  -> 오류: 제품명과 수량이 명확하지 않습니다.")
-                        continue
-                    
-                    data, count = supabase.table("inventory").select("item_id, quantity").eq("product_name", product_name).execute()
-                    if not data[1]:
-                        print(f"  -> 오류: '{product_name}'을(를) 찾을 수 없습니다.")
-                        continue
-
-                    item_id = data[1][0]['item_id']
-                    current_quantity = data[1][0]['quantity']
-
-                    if current_quantity < change_quantity:
-                        print(f"  -> 오류: '{product_name}'의 재고({current_quantity}개)가 부족합니다!")
-                        continue
-                    
-                    print(f"  -> '{product_name}' {change_quantity}개 차감 및 로그 기록...")
-                    new_quantity = current_quantity - change_quantity
-                    supabase.table("inventory").update({"quantity": new_quantity}).eq("product_name", product_name).execute()
-                    
-                    supabase.table("purchase_logs").insert({
-                        "employee_id": employee_id,
-                        "item_id": item_id,
-                        "product_name": product_name,
-                        "quantity": change_quantity
-                    }).execute()
-                    print(f"  -> 완료! '{product_name}'의 현재 재고는 {new_quantity}개 입니다.")
-
-                elif action == "increment":
-                    product_name = payload.get("name")
-                    change_quantity = payload.get("quantity", 0)
-                    if not product_name or change_quantity <= 0:
-                        print("  -> 오류: 제품명과 수량이 명확하지 않습니다.")
-                        continue
-
-                    data, count = supabase.table("inventory").select("id, quantity").eq("product_name", product_name).execute()
-                    current_quantity = data[1][0]['quantity'] if data[1] else 0
-                    new_quantity = current_quantity + change_quantity
-                    
-                    print(f"  -> '{product_name}' {change_quantity}개 추가...")
-                    if not data[1]:
-                        insert_response = supabase.table("inventory").insert({
-                            "product_name": product_name, 
-                            "quantity": new_quantity
-                        }).execute()
-
-                        # item_id를 일단은 id랑 동일하게 하고 나중에 바코드 같은걸로 변경하자
-                        if insert_response.data:
-                            newly_inserted_id = insert_response.data[0]['id']
-                            
-                            supabase.table("inventory").update({
-                                "item_id": newly_inserted_id
-                            }).eq("id", newly_inserted_id).execute()
-                    else:
-                        supabase.table("inventory").update({"quantity": new_quantity}).eq("product_name", product_name).execute()
-                    print(f"  -> 완료! '{product_name}'의 현재 재고는 {new_quantity}개 입니다.")
-
-                elif action == "query_one":
-                    product_name = payload.get("name")
-                    if not product_name:
-                        print("  -> 오류: 제품명이 명확하지 않습니다.")
-                        continue
-                    
-                    data, count = supabase.table("inventory").select("quantity").eq("product_name", product_name).execute()
-                    if data[1]:
-                        print(f"  -> '{product_name}'의 현재 재고는 {data[1][0]['quantity']}개 입니다.")
-                    else:
-                        print(f"  -> '{product_name}'은(는) 재고에 없습니다.")
-                
-                elif action == "show_purchase_logs":
-                    print("  -> 최근 구매 로그를 조회합니다...")
-                    response = supabase.rpc('get_purchase_logs_kst').execute()
-                    if not response.data:
-                        print("  -> 구매 기록이 없습니다.")
-                    else:
-                        print("  -> 최근 구매 기록 (최대 20개):")
-                        for log in response.data:
-                            print(f"    - 일시: {log['created_at']}, 사용자: {log['employee_id']}, 품목ID: {log['item_id']}, 제품: {log['product_name']}, 수량: {log['quantity']}개")
-                
-                elif action == "delete_item":
-                    product_name = payload.get("name")
-                    if not product_name:
-                        print("  -> 오류: 삭제할 제품명이 명확하지 않습니다.")
-                        continue
-                    
-                    print(f"  -> '{product_name}'을(를) 재고에서 삭제합니다...")
-                    data, count = supabase.table("inventory").delete().eq("product_name", product_name).execute()
-                    
-                    if data[1]:
-                         print(f"  -> 완료! '{product_name}'이(가) 재고에서 삭제되었습니다.")
-                    else:
-                         print(f"  -> 오류: '{product_name}'을(를) 찾을 수 없거나 삭제하지 못했습니다.")
-
-                elif action == "add_employee":
-                    # payload에서 임직원 정보 추출
-                    employee_id_to_add = payload.get("employee_id")
-                    name = payload.get("name")
-                    password = payload.get("password")
-                    role = payload.get("role", "") # 역할 미지정시 빈 문자열로 기본값 설정
-
-                    # 필수 정보 확인
-                    if not all([employee_id_to_add, name, password]):
-                        print("  -> 오류: 사번, 이름, 비밀번호는 필수입니다.")
-                        continue
-                    
-                    # 인증 계정 생성을 위한 이메일 주소 생성
-                    email = f"{employee_id_to_add}@company.test"
-                    print(f"  -> 인증 계정 생성 중: {email}...")
-                    
-                    try:
-                        # Supabase Auth에 사용자 등록
-                        auth_response = supabase.auth.sign_up({"email": email, "password": password})
-                        
-                        if auth_response.user:
-                            auth_user_id = auth_response.user.id
-                            print(f"  -> 인증 계정 생성 완료. 임직원 정보 추가 중...")
-                            
-                            # employees 테이블에 임직원 정보 저장
-                            data, count = supabase.table("employees").insert({
-                                "employee_id": employee_id_to_add,
-                                "name": name,
-                                "role": role,
-                                "auth_user_id": auth_user_id
-                            }).execute()
-
-                            if data[1]:
-                                print(f"  -> 완료! 임직원 '{name}'이(가) 추가되었습니다.")
-                            else:
-                                # 테이블 저장 실패 시 생성된 인증 계정 삭제 필요성에 대한 안내
-                                print("  -> 오류: 임직원 정보 추가에 실패했습니다. 생성된 인증 계정을 수동으로 삭제해야 할 수 있습니다.")
-                        else:
-                            print(f"  -> 오류: 인증 계정 생성에 실패했습니다. {auth_response}")
-
-                    except Exception as e:
-                        print(f"  -> 오류: 계정 생성 중 오류 발생: {e}")
-
-                elif action == "delete_employee":
-                    # payload에서 삭제할 임직원 정보 추출
-                    employee_id_to_delete = payload.get("employee_id")
-                    name = payload.get("name")
-                    
-                    if not employee_id_to_delete and not name:
-                        print("  -> 오류: 사번 또는 이름은 필수입니다.")
-                        continue
-
-                    # employees 테이블에서 auth_user_id 조회
-                    print("  -> 삭제할 임직원의 인증 정보를 조회합니다...")
-                    query = supabase.table("employees").select("auth_user_id")
-                    if employee_id_to_delete:
-                        query = query.eq("employee_id", employee_id_to_delete)
-                    else:
-                        query = query.eq("name", name)
-                    
-                    data, count = query.execute()
-
-                    if not data[1]:
-                        print("  -> 오류: 해당 임직원을 찾을 수 없습니다.")
-                        continue
-
-                    auth_user_id_to_delete = data[1][0].get('auth_user_id')
-
-                    # auth_user_id가 없는 경우, 테이블에서만 정보 삭제
-                    if not auth_user_id_to_delete:
-                        print("  -> 오류: 해당 임직원의 인증 계정 정보를 찾을 수 없습니다. 테이블 정보만 삭제합니다.")
-                        if employee_id_to_delete:
-                            supabase.table("employees").delete().eq("employee_id", employee_id_to_delete).execute()
-                        else:
-                            supabase.table("employees").delete().eq("name", name).execute()
-                        print("  -> 완료! employees 테이블에서만 임직원이 삭제되었습니다.")
-                        continue
-
-                    try:
-                        # Supabase Auth에서 사용자 삭제
-                        print(f"  -> 인증 계정 삭제 중: {auth_user_id_to_delete}...")
-                        admin_supabase: Client = create_client(url, service_role_key)
-                        admin_supabase.auth.admin.delete_user(auth_user_id_to_delete)
-                        print("  -> 인증 계정 삭제 완료. 임직원 정보 삭제 중...")
-                        
-                        # employees 테이블에서 임직원 정보 삭제
-                        if employee_id_to_delete:
-                            supabase.table("employees").delete().eq("employee_id", employee_id_to_delete).execute()
-                        else:
-                            supabase.table("employees").delete().eq("name", name).execute()
-                        
-                        print(f"  -> 완료! 임직원이 삭제되었습니다.")
-
-                    except Exception as e:
-                        print(f"  -> 오류: 임직원 삭제 중 오류 발생: {e}")
-
-                else:
-                    print(f"  -> 오류: 알 수 없는 action '{action}' 입니다.")
+            # 되묻기/대화 기록/작업 최적화/재고 부족 알림은 엔진이 GUI와 같은 방식으로 처리
+            session.run(command, show)
 
         except KeyboardInterrupt:
             break
         except Exception as e:
             print(f"처리 중 오류가 발생했습니다: {e}")
-    
+
     print("CLI를 종료합니다.")
+
+
+def run_batch(user_session: Session, lines, out=sys.stdout, workers: int = BATCH_PARSE_WORKERS) -> dict:
+    """
+    비대화형 배치 모드
+    Gemini 파싱은 workers개까지 동시에 미리 진행하고, 실행은 입력 순서대로 CommandEngine으로 합니다.
+    명령마다 JSON 한 줄(실행 이벤트 포함)을 출력하고, 마지막에 처리량 요약을 출력합니다.
+    되물어야 하는 명령(clarify, Gemini의 질문)은 needs_clarification으로 기록되고 실패 명령 수에 포함됩니다.
+    """
+    session = CliSession(user_session, interactive=False)
+    commands = [line.strip() for line in lines]
+    commands = [c for c in commands if c and not c.startswith('#')]
+
+    def parse(command):
+        started = time.perf_counter()
+        try:
+            return session.parse(command), None, time.perf_counter() - started
+        except Exception as e:
+            return None, e, time.perf_counter() - started
+
+    started = time.perf_counter()
+    task_count = 0
+    failed_count = 0
+    clarify_count = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # executor.map은 입력 순서대로 결과를 돌려주므로 실행 순서가 보장됨
+        for index, (command, (parsed, error, parse_elapsed)) in enumerate(zip(commands, executor.map(parse, commands)), start=1):
+            record = {"index": index, "command": command, "parse_ms": round(parse_elapsed * 1000, 1)}
+            if error is not None:
+                record.update(status="fail", error=f"명령 해석 실패: {error}", events=[])
+            elif parsed[0] is None:
+                # JSON 대신 Gemini가 되물은 문장
+                record.update(status="needs_clarification", events=[{"type": "reply", "text": parsed[1]}])
+            else:
+                tasks = parsed[0]
+                exec_started = time.perf_counter()
+                events = []
+                try:
+                    # 답할 사람이 없으므로 Gemini 응답 대신 짧은 안내로 결과를 받음
+                    session.run(command, events.append, tasks=tasks, narrate=False)
+                except Exception as e:
+                    events.append({"type": "error", "text": str(e)})
+                task_count += len(tasks)
+                if any(event["type"] == "error" for event in events):
+                    status = "fail"
+                elif any(task.get("action") == "clarify" for task in tasks):
+                    status = "needs_clarification"
+                else:
+                    status = "success"
+                record.update(status=status, events=[e for e in events if e["type"] != "refresh"],
+                              exec_ms=round((time.perf_counter() - exec_started) * 1000, 1))
+            failed_count += record["status"] != "success"
+            clarify_count += record["status"] == "needs_clarification"
+            out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "commands": len(commands),
+        "tasks": task_count,
+        "failed_commands": failed_count,
+        "needs_clarification": clarify_count,
+        "elapsed_s": round(elapsed, 3),
+        "commands_per_s": round(len(commands) / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+    out.write(json.dumps({"summary": summary}, ensure_ascii=False) + "\n")
+    return summary
+
+
+def sign_in(employee_id: str, password: str) -> Session:
+    config = load_config(os.path.dirname(os.path.abspath(__file__)))
+    # 로그인 전용 클라이언트는 토큰을 갱신하지 않음 (세션은 CliSession의 클라이언트가 이어받아 갱신)
+    client: Client = create_client(config.get("URL"), config.get("API"), options=ClientOptions(auto_refresh_token=False, persist_session=False))
+    return client.auth.sign_in_with_password({"email": f"{employee_id}@company.test", "password": password})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="디저트 재고 관리 CLI")
+    parser.add_argument("employee_id", help="로그인할 사번")
+    parser.add_argument("--batch", metavar="FILE", help="명령 파일로 배치 실행 ('-'이면 표준 입력)")
+    parser.add_argument("--workers", type=int, default=BATCH_PARSE_WORKERS, help="동시에 진행할 Gemini 파싱 수")
+    args = parser.parse_args()
+
+    # 배치 실행 시 표준 입력을 명령으로 쓰므로 비밀번호는 환경 변수로도 받음
+    password = os.getenv("DESSERT_PASSWORD") or getpass.getpass("비밀번호: ")
+    user_session = sign_in(args.employee_id, password)
+
+    if args.batch is None:
+        start_cli(user_session)
+    elif args.batch == "-":
+        summary = run_batch(user_session, sys.stdin, workers=args.workers)
+        sys.exit(1 if summary["failed_commands"] else 0)
+    else:
+        with open(args.batch, encoding="utf-8") as f:
+            summary = run_batch(user_session, f, workers=args.workers)
+        sys.exit(1 if summary["failed_commands"] else 0)
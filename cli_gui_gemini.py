@@ -6,22 +6,37 @@ import os
 import json
 import tomllib
 import google.generativeai as genai
-from supabase import create_client
+from supabase import create_client, ClientOptions
 from supabase_auth.types import Session
 from pydantic import BaseModel, Field
 from typing import Literal, Union
 import sys
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, 
     QVBoxLayout, QHBoxLayout, QTabWidget,
     QPushButton, QTableWidget, QTableWidgetItem,
-    QTextEdit, QSplitter, QHeaderView, QDialog
+    QTextEdit, QSplitter, QHeaderView, QDialog,
+    QFileDialog, QMessageBox, QLabel, QCompleter
 )
-from PySide6.QtCore import Qt, QEvent
+from PySide6.QtCore import Qt, QEvent, Signal, QStringListModel, QTimer
+from PySide6.QtGui import QColor
 from html_templates import HTMLTemplates as tmpl
 from login_dialog import LoginDialog
+import bulk_inventory
+import bulk_employees
+import settlement_report
+from command_engine import CommandEngine, build_system_prompt, describe_result, UI_ACTIONS
+from engine_client import EngineClient
+from session_refresher import SessionRefresher, is_session_expired
+import stock_alerts
+from inventory_snapshot import InventorySnapshot
+from product_trie import ProductTrie
+from barcode_scan import BarcodeIndex, ScanDetector, RestockBatcher, RESTOCK_FLUSH_DELAY_MS
 
 if getattr(sys, 'frozen', False):
     # PyInstaller에 의해 번들된 경우, 실행 파일의 디렉토리를 사용
@@ -33,7 +48,19 @@ else:
 dotenv_path = os.path.join(application_path, '.env')
 load_dotenv(dotenv_path=dotenv_path)
 
+LOW_STOCK_COLOR = QColor("#ffe0e0")
+MAX_RECENT_COMMANDS = 50
+SCAN_REFRESH_DELAY_MS = 300  # 연속 스캔 중에는 재고 표 새로 고침을 모아서 한 번만
+DEFAULT_FLOORS = [2, 3]  # 층 목록을 알기 전(로그인 전, 스냅샷 없음)에 보여줄 탭
+BACKGROUND_REFRESH_MS = 5000  # 가려진 탭을 하나씩 새로 고치는 간격
+
 class InventoryApp(QMainWindow):
+    # SessionRefresher 콜백은 백그라운드 스레드에서 호출되므로 시그널로 UI 스레드에 전달
+    session_refreshed = Signal(object)
+    session_refresh_failed = Signal(str)
+    # 백그라운드 엔진 작업의 이벤트를 UI 스레드의 표시 함수로 전달 (표시 함수, 이벤트)
+    engine_event = Signal(object, object)
+
     def __init__(self, user_session: Session = None):
         super().__init__()
         self.user_session = user_session
@@ -43,6 +70,34 @@ class InventoryApp(QMainWindow):
         self.employee_id = None
         self.user_name = ""
         self.system_prompt = ""
+        self.admin_supabase = None
+        self.engine = None
+        self.engine_client = None
+        self.session_refresher = None
+        self.stock_monitor = stock_alerts.load_monitor(os.path.join(application_path, 'alerts.toml'), application_path)
+        try:
+            self.snapshot = InventorySnapshot(os.path.join(application_path, 'inventory_snapshot.db'))
+        except Exception as e:
+            print(f"Warning: Could not open inventory snapshot. {e}")
+            self.snapshot = None
+        # 바코드 스캔: 색인은 로그인 시 불러오고, 입고 스캔은 모아서 한 번에 반영
+        self.barcode_index = BarcodeIndex()
+        self.scan_detector = ScanDetector(prefix=os.getenv("BARCODE_PREFIX", ""))
+        self.restock_batcher = RestockBatcher()
+        self.restock_timer = QTimer(self)
+        self.restock_timer.setSingleShot(True)
+        self.restock_timer.setInterval(RESTOCK_FLUSH_DELAY_MS)
+        self.restock_timer.timeout.connect(self.flush_restock_scans)
+        self.scan_refresh_timer = QTimer(self)
+        self.scan_refresh_timer.setSingleShot(True)
+        self.scan_refresh_timer.setInterval(SCAN_REFRESH_DELAY_MS)
+        self.scan_refresh_timer.timeout.connect(self.update_inventory_displays)
+        # Gemini/DB 호출은 UI 스레드 밖의 작업자 하나에서 순서대로 실행 (재시도 대기 중에도 창이 멈추지 않음)
+        self.engine_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="engine")
+        self._running_commands = 0
+        self.engine_event.connect(self._dispatch_engine_event)
+        self.session_refreshed.connect(self._on_session_refreshed)
+        self.session_refresh_failed.connect(self._on_session_refresh_failed)
 
         self.setWindowTitle("JLT Dessert ChatBot")
         self.setGeometry(100, 100, 800, 600)
@@ -68,6 +123,16 @@ class InventoryApp(QMainWindow):
         self.input_line.setMaximumHeight(90)
         self.input_line.installEventFilter(self)
 
+        # 자동완성: 제품명/층/최근 명령을 자모 단위 접두사로 찾아 입력창 아래에 표시
+        self.trie = ProductTrie()
+        self.recent_commands = deque()
+        self.completer_model = QStringListModel()
+        self.completer = QCompleter(self.completer_model, self)
+        self.completer.setWidget(self.input_line)
+        self.completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.completer.activated.connect(self._insert_completion)
+        self.input_line.textChanged.connect(self._update_completions)
+
         self.input_button = QPushButton("전송")
         self.input_button.setFixedHeight(90)
         self.input_button.clicked.connect(self.process_input)
@@ -80,23 +145,40 @@ class InventoryApp(QMainWindow):
         right_layout = QVBoxLayout(right_panel)
         right_layout.setContentsMargins(10, 10, 10, 10)
         
+        # 층 탭은 inventory의 층 목록으로 만들고, 각 탭의 재고는 처음 보일 때 불러옴
         self.tabs = QTabWidget()
-        self.inventory_display_floor2 = self._create_inventory_table()
-        self.inventory_display_floor3 = self._create_inventory_table()
-        
-        self.tabs.addTab(self.inventory_display_floor2, "2층")
-        self.tabs.addTab(self.inventory_display_floor3, "3층")
+        self.floor_tables = {}  # 층 -> 재고 표
+        self._floor_rows = {}  # 층 -> 마지막으로 받은 재고 행
+        self._stale_floors = set()  # 표시 내용이 최신이 아닌 층
+        self._viewed_floors = set()  # 한 번이라도 열어 본 층 (이 층들만 백그라운드로 새로 고침)
+        self._ensure_floor_tabs(DEFAULT_FLOORS)
+        self.tabs.currentChanged.connect(self._on_floor_tab_changed)
+        self.background_refresh_timer = QTimer(self)
+        self.background_refresh_timer.setInterval(BACKGROUND_REFRESH_MS)
+        self.background_refresh_timer.timeout.connect(self._refresh_hidden_floor)
 
         self.login_button = QPushButton("로그인")
         self.login_button.clicked.connect(self.handle_login)
         self.logout_button = QPushButton("로그아웃")
         self.logout_button.clicked.connect(self.handle_logout)
+        # 관리자 전용: 켜 두면 바코드 스캔이 차감 대신 입고로 처리됨
+        self.restock_scan_button = QPushButton("입고 스캔")
+        self.restock_scan_button.setCheckable(True)
+        self.restock_scan_button.setVisible(False)
+        self.restock_scan_button.toggled.connect(self._on_restock_scan_toggled)
 
         button_layout = QHBoxLayout()
+        button_layout.addWidget(self.restock_scan_button)
         button_layout.addStretch()
         button_layout.addWidget(self.login_button)
         button_layout.addWidget(self.logout_button)
 
+        # 로컬 스냅샷을 보여주는 동안 표시되는 "마지막 동기화" 안내
+        self.stale_label = QLabel()
+        self.stale_label.setObjectName("staleLabel")
+        self.stale_label.setVisible(False)
+
+        right_layout.addWidget(self.stale_label)
         right_layout.addWidget(self.tabs)
         right_layout.addLayout(button_layout)
 
@@ -114,12 +196,74 @@ class InventoryApp(QMainWindow):
 
     def eventFilter(self, obj, event):
         if obj is self.input_line and event.type() == QEvent.KeyPress:
+            # 자동완성 목록이 열려 있으면 선택/닫기 키는 목록에 넘김
+            if self.completer.popup().isVisible() and event.key() in (
+                    Qt.Key_Return, Qt.Key_Enter, Qt.Key_Escape, Qt.Key_Tab, Qt.Key_Backtab):
+                event.ignore()
+                return True
             if event.key() in (Qt.Key_Return, Qt.Key_Enter):
                 if not (event.modifiers() & Qt.ShiftModifier):
-                    self.process_input()
+                    barcode = self.scan_detector.match(self.input_line.toPlainText())
+                    self.scan_detector.reset()
+                    if barcode:
+                        self.handle_scan(barcode)
+                    else:
+                        self.process_input()
                     return True # 이벤트가 처리되었음을 알림
+            elif event.text() and event.text().isprintable():
+                self.scan_detector.key()
         return super().eventFilter(obj, event)
 
+    def _update_completions(self):
+        text = self.input_line.toPlainText()
+        token = text.split()[-1] if text.strip() and not text[-1].isspace() else ""
+        if not self.supabase or not token:
+            self.completer.popup().hide()
+            return
+
+        candidates = [c for c in self.trie.complete(token, kinds=("product", "floor")) if c != token]
+        # 입력 전체가 최근 명령의 앞부분이면 명령 전체도 제안
+        for command in self.trie.complete(text, limit=3, kinds=("command",)):
+            if command != text and command not in candidates:
+                candidates.append(command)
+        if not candidates:
+            self.completer.popup().hide()
+            return
+
+        self.completer_model.setStringList(candidates)
+        rect = self.input_line.cursorRect()
+        rect.setWidth(self.completer.popup().sizeHintForColumn(0) + self.completer.popup().verticalScrollBar().sizeHint().width())
+        self.completer.complete(rect)
+
+    def _insert_completion(self, completion: str):
+        """선택한 후보로 마지막 단어(최근 명령이면 입력 전체)를 교체"""
+        text = self.input_line.toPlainText()
+        if completion in self.recent_commands:
+            new_text = completion
+        else:
+            head = text.rstrip()
+            cut = max(head.rfind(" "), head.rfind("\n"))
+            new_text = head[:cut + 1] + completion + " "
+
+        self.input_line.blockSignals(True)
+        self.input_line.setPlainText(new_text)
+        self.input_line.blockSignals(False)
+        cursor = self.input_line.textCursor()
+        cursor.movePosition(cursor.MoveOperation.End)
+        self.input_line.setTextCursor(cursor)
+        self.completer.popup().hide()
+
+    def _remember_command(self, command: str):
+        """최근 명령을 자동완성 후보에 추가 (오래된 것부터 MAX_RECENT_COMMANDS개까지 유지)"""
+        if "\n" in command:
+            return
+        if command in self.recent_commands:
+            self.recent_commands.remove(command)
+        self.recent_commands.append(command)
+        self.trie.insert(command, kind="command")
+        while len(self.recent_commands) > MAX_RECENT_COMMANDS:
+            self.trie.remove(self.recent_commands.popleft(), kind="command")
+
     def _create_inventory_table(self):
         table = QTableWidget()
         table.setEditTriggers(QTableWidget.NoEditTriggers)
@@ -147,7 +291,8 @@ class InventoryApp(QMainWindow):
                 url = os.getenv("URL")
                 key = os.getenv("API")
                 
-                temp_supabase = create_client(url, key)
+                # 로그인에만 쓰는 클라이언트는 토큰을 갱신하지 않음 (갱신은 SessionRefresher 하나만)
+                temp_supabase = create_client(url, key, options=ClientOptions(auto_refresh_token=False, persist_session=False))
                 self.user_session = temp_supabase.auth.sign_in_with_password({"email": email, "password": password})
                 
                 self.initialize_backend()
@@ -160,8 +305,23 @@ class InventoryApp(QMainWindow):
                 self.chat_display.append(tmpl.generate_system_message(f"로그인 실패: {e}", is_error=True))
 
     def handle_logout(self):
+        self.flush_restock_scans()
+        # 반영하지 못한 입고 스캔은 이 사용자의 멱등 키에 묶여 있으므로 다음 사용자에게 넘기지 않음
+        dropped = self.restock_batcher.reset()
+        if dropped:
+            self.chat_display.append(tmpl.generate_system_message(
+                f"반영하지 못한 입고 스캔 {dropped}개를 취소했습니다. 다시 로그인한 뒤 스캔해주세요.", is_error=True))
+        self.restock_scan_button.setChecked(False)
+        self.restock_scan_button.setVisible(False)
+        self.barcode_index.clear()
+        if self.session_refresher:
+            self.session_refresher.stop()
+            self.session_refresher = None
         self.user_session = None
         self.supabase = None
+        self.admin_supabase = None
+        self.engine = None
+        self.engine_client = None
         self.gemini_model = None
         self.is_admin = False
         self.employee_id = None
@@ -174,6 +334,15 @@ class InventoryApp(QMainWindow):
         self.update_inventory_displays()
         self.chat_display.append(tmpl.generate_system_message("로그아웃되었습니다."))
 
+    def _on_session_refreshed(self, session):
+        self.user_session.session = session
+        if self.engine_client:
+            self.engine_client.access_token = session.access_token
+            self.engine_client.refresh_token = session.refresh_token
+
+    def _on_session_refresh_failed(self, message: str):
+        self.chat_display.append(tmpl.generate_system_message(f"로그인 세션 갱신 실패: {message}", is_error=True))
+
     def initialize_backend(self):
         try:
             if getattr(sys, 'frozen', False):
@@ -192,11 +361,9 @@ class InventoryApp(QMainWindow):
             with open(os.path.join(base_path, 'prompts.toml'), "rb") as f:
                 cfg = tomllib.load(f)
 
-            base_prompt_str   = cfg["base_prompt"]
-            admin_actions_str = cfg["admin_actions"]
-            common_actions_str= cfg["common_actions"]
-
-            self.supabase = create_client(self.url, key)
+            # 세션 갱신은 SessionRefresher만 함. 내장 자동 갱신도 켜 두면 이미 교체된 refresh token을 다시 써서
+            # GoTrue가 토큰 재사용으로 보고 세션 전체를 무효화할 수 있음
+            self.supabase = create_client(self.url, key, options=ClientOptions(auto_refresh_token=False))
             self.supabase.auth.set_session(self.user_session.session.access_token, self.user_session.session.refresh_token)
             
             genai.configure(api_key=gemini_api_key)
@@ -219,62 +386,376 @@ class InventoryApp(QMainWindow):
                 self.chat_display.append(tmpl.generate_system_message(f"사용자 정보 확인 중 오류 발생: {e}", is_error=True))
                 return
 
-            self.system_prompt = base_prompt_str
-            if self.is_admin:
-                self.system_prompt += admin_actions_str + common_actions_str.replace("- 'decrement'", "4. 'decrement'")
-            else:
-                self.system_prompt += common_actions_str.replace("- 'decrement'", "1. 'decrement'")
+            self.system_prompt = build_system_prompt(cfg, self.is_admin)
+            self.engine = CommandEngine(self.supabase, self.gemini_model, self.employee_id, self.is_admin, self.system_prompt)
+            self.engine.stock_monitor = self.stock_monitor
+
+            # 만료 전에 세션을 갱신하여 장시간 켜 두는 키오스크에서도 재로그인이 필요 없게 함
+            self.session_refresher = SessionRefresher(
+                self.supabase.auth, self.user_session.session,
+                on_refreshed=self.session_refreshed.emit,
+                on_failed=lambda e: self.session_refresh_failed.emit(str(e)),
+            )
+            self.session_refresher.start()
+            self.engine.session_guard = self.session_refresher
+
+            # ENGINE_URL이 있으면 명령 처리를 공유 서비스(engine_service.py)에 맡김
+            engine_url = os.getenv("ENGINE_URL")
+            if engine_url:
+                self.engine_client = EngineClient(engine_url, self.user_session.session.access_token, self.user_session.session.refresh_token)
+
+            try:
+                self.barcode_index.load(self.supabase)
+            except Exception as e:
+                print(f"Warning: Could not load barcodes. {e}")
+            self.restock_scan_button.setVisible(self.is_admin)
 
             self.chat_display.append(tmpl.generate_login_info_message(user_email, self.is_admin))
 
         except Exception as e:
             self.chat_display.append(tmpl.generate_system_message(f"초기화 오류: {e}", is_error=True))
 
-    def get_natural_response_from_data(self, original_command: str, action: str, db_data: dict) -> str:
-        """DB에서 받은 데이터를 바탕으로 Gemini를 호출하여 자연어 응답을 생성"""
+    def current_floor(self):
+        """선택된 재고 탭의 층 번호 (탭이 없으면 None)"""
+        widget = self.tabs.currentWidget()
+        return next((floor for floor, table in self.floor_tables.items() if table is widget), None)
+
+    def handle_scan(self, barcode: str):
+        """스캔된 바코드를 Gemini 호출 없이 바로 차감(입고 스캔 중이면 입고 대기열에 추가)"""
+        self.input_line.clear()
+        self.completer.popup().hide()
+        if not self.supabase:
+            return
+
+        item = self.barcode_index.lookup(barcode)
+        if item is None:
+            self.chat_display.append(tmpl.generate_system_message(f"등록되지 않은 바코드입니다: {barcode}", is_error=True))
+            return
+        product_name, floor = item
+        floor = floor or self.current_floor()
+        if floor is None:
+            self.chat_display.append(tmpl.generate_system_message(f"층을 알 수 없는 바코드입니다: {barcode}", is_error=True))
+            return
+
+        if self.restock_scan_button.isChecked():
+            if self.restock_batcher.add(product_name, floor):
+                self.flush_restock_scans()
+            else:
+                self.restock_timer.start()
+            self.statusBar().showMessage(f"입고 대기: {floor}층 {product_name} (총 {self.restock_batcher.pending_count}개)")
+            return
+
+        tasks = [{"action": "decrement", "payload": {"name": product_name, "floor": floor, "quantity": 1}}]
+        command = f"바코드 {barcode}"
+        engine, engine_client = self.engine, self.engine_client
+
+        def work(emit):
+            if engine_client:
+                for event in engine_client.submit(command, tasks=tasks, narrate=False):
+                    emit(event)
+            else:
+                engine.run(command, emit, tasks=tasks, narrate=False)
+        self._submit_engine_work(work, self._render_scan_event, error_prefix="스캔 처리 중 오류가 발생했습니다")
+
+    def _render_scan_event(self, event: dict):
+        # 연속 스캔 중 재고 표 새로 고침은 마지막 스캔 뒤 한 번만
+        if event.get("type") == "refresh":
+            self.scan_refresh_timer.start()
+        else:
+            self.render_engine_event(event)
+
+    def _on_restock_scan_toggled(self, checked: bool):
+        if checked:
+            self.chat_display.append(tmpl.generate_system_message("입고 스캔을 시작합니다. 스캔한 제품은 모아서 입고 처리됩니다."))
+        else:
+            self.flush_restock_scans()
+            self.statusBar().clearMessage()
+
+    def flush_restock_scans(self):
+        """모아 둔 입고 스캔을 한 번의 일괄 쓰기로 반영"""
+        self.restock_timer.stop()
+        if not self.supabase or not self.restock_batcher.pending_count:
+            return
+
+        call = self.session_refresher.call if self.session_refresher else lambda fn, *args: fn(*args)
         try:
-            response_generation_prompt = f'''
-            사용자의 원래 요청: '{original_command}'
-            수행된 작업: '{action}'
-            데이터베이스 결과: {json.dumps(db_data, ensure_ascii=False)}
+            diff, applied, errors = call(self.restock_batcher.flush, self.supabase)
+        except Exception as e:
+            self.chat_display.append(tmpl.generate_system_message(f"입고 스캔 반영 중 오류 발생: {e}", is_error=True))
+            return
 
-            위 정보를 바탕으로 사용자에게 전달할 친절하고 자연스러운 응답 메시지를 한 문장으로 생성해줘.
-            '''
-            
-            response = self.gemini_model.generate_content(response_generation_prompt)
-            return response.text
-        
+        for row in diff:
+            self.stock_monitor.observe(row["product_name"], row["floor"], row["after"])
+        self.chat_display.append(tmpl.generate_system_message(
+            f"입고 스캔 반영: {applied}개 품목, 총 {sum(row['change'] for row in diff)}개"
+        ))
+        self.chat_display.append(tmpl.generate_row_errors_html(errors, title="반영하지 못한 항목"))
+        self.statusBar().clearMessage()
+        if applied:
+            self.update_inventory_displays()
+        # 반영하지 못한 배치를 먼저 다시 보낸 경우 그동안 모인 스캔은 다음 반영 때 처리
+        if self.restock_batcher.pending_count and not errors:
+            self.restock_timer.start()
+
+    def closeEvent(self, event):
+        self.flush_restock_scans()
+        self.engine_executor.shutdown(wait=False, cancel_futures=True)
+        super().closeEvent(event)
+
+    def handle_bulk_restock(self) -> bool:
+        """CSV/Excel 파일로 재고를 일괄 입고. 미리보기 확인 후 반영하며, 반영 여부를 반환"""
+        path, _ = QFileDialog.getOpenFileName(self, "입고 파일 선택", "", "재고 파일 (*.csv *.xlsx *.xls)")
+        if not path:
+            return False
+
+        # 다른 재고 조회와 같이 세션이 만료됐으면 갱신 후 다시 시도
+        call = self.session_refresher.call if self.session_refresher else lambda fn, *args, **kwargs: fn(*args, **kwargs)
+        try:
+            df = bulk_inventory.read_table_file(path)
+            rows, row_errors = bulk_inventory.validate_restock_rows(df)
+            diff = call(bulk_inventory.build_restock_diff, self.supabase, rows)
         except Exception as e:
-            return tmpl.generate_system_message(f"응답 생성 중 오류 발생: {e}", is_error=True)
+            self.chat_display.append(tmpl.generate_system_message(f"입고 파일을 읽는 중 오류 발생: {e}", is_error=True))
+            return False
+
+        self.chat_display.append(tmpl.generate_restock_preview_html(diff))
+        self.chat_display.append(tmpl.generate_row_errors_html(row_errors))
+        if not diff:
+            return False
+
+        answer = QMessageBox.question(self, "일괄 입고", f"{len(diff)}개 품목을 입고하시겠습니까?")
+        if answer != QMessageBox.Yes:
+            self.chat_display.append(tmpl.generate_system_message("일괄 입고를 취소했습니다."))
+            return False
+
+        # 확인 창을 띄운 사이 세션이 만료돼도 갱신 후 같은 멱등 키로 다시 보내므로, 먼저 반영된 배치가 두 번 더해지지 않음
+        try:
+            applied, write_errors = call(bulk_inventory.apply_bulk_restock, self.supabase, diff, idempotency_key=uuid.uuid4().hex)
+        except Exception as e:
+            self.chat_display.append(tmpl.generate_system_message(f"일괄 입고 중 오류 발생: {e}", is_error=True))
+            return False
+        failed_keys = {(e["product_name"], e["floor"]) for e in write_errors}
+        for row in diff:
+            if (row["product_name"], row["floor"]) not in failed_keys:
+                self.stock_monitor.observe(row["product_name"], row["floor"], row["after"])
+        self.chat_display.append(tmpl.generate_system_message(f"일괄 입고 완료: {applied}건 반영, {len(write_errors)}건 실패"))
+        self.chat_display.append(tmpl.generate_row_errors_html(write_errors, title="반영하지 못한 항목"))
+        return applied > 0
+
+    def handle_export_inventory(self):
+        """현재 재고를 CSV/Excel 파일로 내보내기"""
+        path, _ = QFileDialog.getSaveFileName(self, "재고 내보내기", "inventory.csv", "CSV (*.csv);;Excel (*.xlsx)")
+        if not path:
+            return
+
+        try:
+            count = bulk_inventory.export_inventory(self.supabase, path)
+            self.chat_display.append(tmpl.generate_system_message(f"재고 {count}건을 내보냈습니다: {path}"))
+        except Exception as e:
+            self.chat_display.append(tmpl.generate_system_message(f"재고 내보내기 중 오류 발생: {e}", is_error=True))
+
+    def handle_settlement_report(self, task):
+        """기간의 구매 기록을 합산한 정산 보고서를 파일로 저장하고 요약을 표시"""
+        try:
+            start, end = settlement_report.resolve_period(task.get("payload", {}))
+        except ValueError as e:
+            self.chat_display.append(tmpl.generate_system_message(str(e), is_error=True))
+            return
+
+        path, _ = QFileDialog.getSaveFileName(self, "정산 보고서 저장", f"settlement_{start:%Y-%m}.csv", "CSV (*.csv);;Excel (*.xlsx)")
+        if not path:
+            return
+
+        call = self.session_refresher.call if self.session_refresher else lambda fn, *args: fn(*args)
+        try:
+            report = call(settlement_report.build_settlement, self.supabase, start, end)
+            settlement_report.write_settlement(report, path)
+        except Exception as e:
+            self.chat_display.append(tmpl.generate_system_message(f"정산 보고서 생성 중 오류 발생: {e}", is_error=True))
+            return
+
+        self.chat_display.append(tmpl.generate_settlement_summary_html(report))
+        self.chat_display.append(tmpl.generate_system_message(f"정산 보고서를 저장했습니다: {path} ({report['elapsed']:.1f}초)"))
+
+    def get_admin_client(self):
+        """service role 키로 만든 관리자 클라이언트 (처음 사용할 때 한 번만 생성)"""
+        if self.admin_supabase is None:
+            self.admin_supabase = create_client(self.url, self.service_role_key)
+        return self.admin_supabase
+
+    def handle_bulk_add_employees(self):
+        """명단 파일(CSV/Excel)로 임직원을 일괄 등록"""
+        path, _ = QFileDialog.getOpenFileName(self, "임직원 명단 선택", "", "명단 파일 (*.csv *.xlsx *.xls)")
+        if not path:
+            return
+
+        try:
+            df = bulk_employees.read_roster_file(path)
+            rows, row_errors = bulk_employees.validate_roster_rows(df)
+        except Exception as e:
+            self.chat_display.append(tmpl.generate_system_message(f"명단 파일을 읽는 중 오류 발생: {e}", is_error=True))
+            return
+
+        self.chat_display.append(tmpl.generate_row_errors_html(row_errors, title="검증에 실패한 행"))
+        if not rows:
+            return
+
+        answer = QMessageBox.question(self, "임직원 일괄 등록", f"{len(rows)}명의 임직원을 등록하시겠습니까?")
+        if answer != QMessageBox.Yes:
+            self.chat_display.append(tmpl.generate_system_message("임직원 일괄 등록을 취소했습니다."))
+            return
+
+        self.chat_display.append(tmpl.generate_system_message(f"임직원 {len(rows)}명을 등록합니다..."))
+        try:
+            report = bulk_employees.provision_employees(self.supabase, self.get_admin_client(), rows)
+        except Exception as e:
+            self.chat_display.append(tmpl.generate_system_message(f"임직원 일괄 등록 중 오류 발생: {e}", is_error=True))
+            return
+
+        self.chat_display.append(tmpl.generate_system_message(
+            f"임직원 일괄 등록 완료: {report['inserted']}/{report['requested']}명 등록, "
+            f"{len(report['failures'])}건 실패 (롤백 {report['rolled_back']}건), "
+            f"{report['elapsed']:.1f}초 ({report['throughput']:.1f}명/초)"
+        ))
+        self.chat_display.append(tmpl.generate_row_errors_html(report["failures"], title="등록하지 못한 임직원"))
 
     def update_inventory_displays(self):
         if not self.supabase:
-            self._populate_table_logged_out(self.inventory_display_floor2)
-            self._populate_table_logged_out(self.inventory_display_floor3)
+            self.background_refresh_timer.stop()
+            # 로그인 전/로그아웃 후에는 마지막으로 받은 재고를 바로 보여줌
+            rows = self.snapshot.load() if self.snapshot else []
+            if not rows:
+                self.stale_label.setVisible(False)
+                self._floor_rows = {}
+                for table in self.floor_tables.values():
+                    self._populate_table_logged_out(table)
+                return
+            self._show_inventory(rows)
+            synced_at = self.snapshot.synced_at
+            self.stale_label.setText(f"마지막 동기화: {synced_at:%Y-%m-%d %H:%M} 기준 (로그인하면 최신 정보로 갱신됩니다)")
+            self.stale_label.setVisible(True)
             return
 
+        call = self.session_refresher.call if self.session_refresher else lambda fn, *args: fn(*args)
         try:
-            data_f2, _ = self.supabase.table("inventory").select("product_name, quantity").eq("floor", 2).order("product_name").execute()
-            self._populate_table(self.inventory_display_floor2, data_f2[1])
-
-            data_f3, _ = self.supabase.table("inventory").select("product_name, quantity").eq("floor", 3).order("product_name").execute()
-            self._populate_table(self.inventory_display_floor3, data_f3[1])
+            # 층 목록만 받고, 각 층의 재고는 탭이 보일 때 조회 (스냅샷이 있으면 그 층만 변경분으로 맞춤)
+            self._floor_rows = {}
+            self._ensure_floor_tabs(call(self._fetch_floors) or DEFAULT_FLOORS)
+            self._stale_floors = set(self.floor_tables)
+            self._render_floor(self.current_floor())
+            self.stale_label.setVisible(False)
+            self.background_refresh_timer.start()
 
         except Exception as e:
             self.chat_display.append(tmpl.generate_system_message(f"재고 현황을 불러오는 중 오류 발생: {e}", is_error=True))
 
-    def _populate_table(self, table_widget, data):
+    def _fetch_floors(self) -> list:
+        """inventory에 있는 층 목록 (query.md의 get_inventory_floors RPC, 없으면 floor 열만 조회)"""
+        try:
+            data = self.supabase.rpc('get_inventory_floors').execute().data
+        except Exception as e:
+            if is_session_expired(e):
+                raise
+            data = self.supabase.table("inventory").select("floor").execute().data
+        return sorted({row["floor"] for row in data or [] if row.get("floor") is not None})
+
+    def _fetch_floor(self, floor) -> list:
+        if self.snapshot:
+            return self.snapshot.sync(self.supabase, floor)
+        response = self.supabase.table("inventory").select("product_name, quantity").eq("floor", floor).order("product_name").execute()
+        return [dict(row, floor=floor) for row in response.data]
+
+    def _ensure_floor_tabs(self, floors):
+        """층 목록에 맞게 탭을 추가/삭제 (층 순서대로, 기존 탭과 선택은 유지)"""
+        floors = sorted(set(floors))
+        self.tabs.blockSignals(True)
+        for floor in [f for f in self.floor_tables if f not in floors]:
+            self.tabs.removeTab(self.tabs.indexOf(self.floor_tables.pop(floor)))
+            self._floor_rows.pop(floor, None)
+            self._stale_floors.discard(floor)
+            self._viewed_floors.discard(floor)
+        for floor in floors:
+            if floor not in self.floor_tables:
+                table = self._create_inventory_table()
+                self.floor_tables[floor] = table
+                self.tabs.insertTab(sum(1 for f in self.floor_tables if f < floor), table, f"{floor}층")
+                self._stale_floors.add(floor)
+        self.tabs.blockSignals(False)
+
+    def _show_inventory(self, rows):
+        """전체 재고 행으로 탭을 맞추고, 보이는 탭만 바로 그림 (나머지는 보일 때 그림)"""
+        by_floor = {}
+        for row in rows:
+            by_floor.setdefault(row["floor"], []).append(row)
+        self._seed_stock(rows)
+        self._ensure_floor_tabs(list(by_floor) or DEFAULT_FLOORS)
+        self._floor_rows = {floor: by_floor.get(floor, []) for floor in self.floor_tables}
+        self._stale_floors = set(self.floor_tables)
+        self._render_floor(self.current_floor())
+
+    def _render_floor(self, floor):
+        """한 층의 탭을 최신 내용으로 그림. 받아 둔 행이 없으면 그 층만 조회"""
+        if floor is None or floor not in self.floor_tables:
+            return
+        rows = self._floor_rows.get(floor)
+        if rows is None:
+            if not self.supabase:
+                return
+            call = self.session_refresher.call if self.session_refresher else lambda fn, *args: fn(*args)
+            try:
+                rows = call(self._fetch_floor, floor)
+            except Exception as e:
+                self.chat_display.append(tmpl.generate_system_message(f"{floor}층 재고를 불러오는 중 오류 발생: {e}", is_error=True))
+                return
+            self._floor_rows[floor] = rows
+
+        self._populate_table(self.floor_tables[floor], rows, floor=floor)
+        self._stale_floors.discard(floor)
+        self._viewed_floors.add(floor)
+        self._sync_completions()
+
+    def _on_floor_tab_changed(self, index):
+        floor = self.current_floor()
+        if floor in self._stale_floors:
+            self._render_floor(floor)
+
+    def _refresh_hidden_floor(self):
+        """낮은 우선순위 새로 고침: 열어 본 적 있는 가려진 탭 중 하나만 최신으로 맞춤"""
+        current = self.current_floor()
+        for floor in sorted(self._stale_floors & self._viewed_floors):
+            if floor != current:
+                self._render_floor(floor)
+                return
+
+    def _sync_completions(self):
+        """재고가 바뀔 때 자동완성 후보를 바뀐 항목만 추가/삭제"""
+        self.trie.sync("product", {row["product_name"] for rows in self._floor_rows.values() for row in rows})
+        self.trie.sync("floor", {f"{floor}층" for floor in self.floor_tables})
+
+    def _populate_table(self, table_widget, data, floor=None):
         table_widget.setRowCount(0)
         if data:
+            self._seed_stock(data, floor)
             for row_idx, product in enumerate(data):
                 table_widget.insertRow(row_idx)
-                table_widget.setItem(row_idx, 0, QTableWidgetItem(str(product['product_name'])))
-                table_widget.setItem(row_idx, 1, QTableWidgetItem(str(product['quantity'])))
+                name_item = QTableWidgetItem(str(product['product_name']))
+                quantity_item = QTableWidgetItem(str(product['quantity']))
+                # 재고 부족 품목 강조
+                if self.stock_monitor.is_low(product['product_name'], floor):
+                    name_item.setBackground(LOW_STOCK_COLOR)
+                    quantity_item.setBackground(LOW_STOCK_COLOR)
+                table_widget.setItem(row_idx, 0, name_item)
+                table_widget.setItem(row_idx, 1, quantity_item)
         else:
             table_widget.setRowCount(1)
             table_widget.setItem(0, 0, QTableWidgetItem("재고가 비어있습니다."))
             table_widget.setItem(0, 1, QTableWidgetItem(""))
 
+    def _seed_stock(self, rows, floor=None):
+        """새로 받은 재고로 부족 상태를 맞추고, 다른 키오스크에서 기준 이하로 떨어진 품목은 알림 표시"""
+        for alert in self.stock_monitor.seed(rows, floor):
+            self.render_engine_event({"type": "alert", **alert})
+
     def _populate_table_logged_out(self, table_widget):
         table_widget.setRowCount(1)
         table_widget.setItem(0, 0, QTableWidgetItem("로그인 후 재고 정보를 볼 수 있습니다."))
@@ -286,6 +767,8 @@ class InventoryApp(QMainWindow):
             return
         
         self.input_line.clear()
+        self.completer.popup().hide()
+        self._remember_command(command)
 
         if command.lower() == 'exit':
             self.close()
@@ -296,168 +779,128 @@ class InventoryApp(QMainWindow):
 
         self.chat_display.append(tmpl.generate_user_message(self.user_name, html_command))
 
-        full_prompt = self.system_prompt + "\n사용자 요청: " + command
-        
-        try:
-            gemini_response = self.gemini_model.generate_content(full_prompt)
-            response_text = gemini_response.text.strip()
-            
-            # self.chat_display.append(tmpl.generate_gemini_message())
+        engine, engine_client = self.engine, self.engine_client
+        ui_tasks = []
 
-            if response_text.startswith('```json'):
-                response_text = response_text.lstrip('```json').strip()
-            if response_text.endswith('```'):
-                response_text = response_text.rstrip('```').strip()
+        def render(event):
+            # 파일 선택 등 화면 전용 작업은 모아 두었다가 명령 처리가 끝난 뒤 UI 스레드에서 실행
+            if event.get("type") == "task":
+                ui_tasks.append(event["task"])
+            else:
+                self.render_engine_event(event)
 
-            tasks_to_execute = []
+        def work(emit):
+            if engine_client:
+                for event in engine_client.submit(command):
+                    emit(event)
+            else:
+                # 공유 서비스와 같이 화면 전용 작업은 실행하지 않고 "task" 이벤트로 넘겨받음
+                handlers = {action: lambda task: emit({"type": "task", "task": task}) for action in UI_ACTIONS}
+                engine.run(command, emit, handlers=handlers)
+
+        self._submit_engine_work(work, render, on_done=lambda: self._run_ui_tasks(ui_tasks))
+
+    def _submit_engine_work(self, work, render, on_done=None, error_prefix: str = "처리 중 오류가 발생했습니다"):
+        """
+        work(emit)를 엔진 작업자 스레드에서 실행 (앞의 작업이 끝난 뒤 순서대로)
+        emit으로 보낸 이벤트와 on_done은 UI 스레드에서 실행됨
+        """
+        emit = lambda event: self.engine_event.emit(render, event)
+        self._running_commands += 1
+        self.statusBar().showMessage("처리 중...")
+
+        def finish(_):
+            self._running_commands -= 1
+            if not self._running_commands:
+                self.statusBar().clearMessage()
+            if on_done:
+                on_done()
+
+        def run():
             try:
-                if response_text.startswith('['):
-                    tasks_to_execute = json.loads(response_text)
-                elif response_text.startswith('{'):
-                    tasks_to_execute = [json.loads(response_text)]
-                else:
-                    fixed_text = f"[{response_text.replace('}{', '},{')}]"
-                    tasks_to_execute = json.loads(fixed_text)
-
-            except json.JSONDecodeError:
-                self.chat_display.append(tmpl.generate_gemini_message(response_text))
-                return
+                work(emit)
             except Exception as e:
-                self.chat_display.append(tmpl.generate_system_message(f"JSON 파싱 중 알 수 없는 오류\n받은 내용:{response_text}", is_error=True))
-                return
-
-            execution_results = []
-            update_required = False
-
-            for task in tasks_to_execute:
-                action = task.get("action")
-                payload = task.get("payload", {})
-
-                if action in ["query_all", "query_one", "increment", "show_purchase_logs", "delete_item", "add_employee", "delete_employee", "query_employees"] and not self.is_admin:
-                    self.chat_display.append(tmpl.generate_system_message("이 명령을 실행할 권한이 없습니다.", is_error=True))
-                    continue
-
-                if action == "query_all":
-                    self.update_inventory_displays()
-                    self.chat_display.append(tmpl.generate_system_message("재고 현황을 새로고침했습니다."))
-                    continue
-
-                elif action == "query_one":
-                    product_name = payload.get("name")
-                    if not product_name:
-                        self.chat_display.append(tmpl.generate_system_message("제품명이 명확하지 않습니다.", is_error=True))
-                        continue
-                    data, _ = self.supabase.table("inventory").select("product_name, quantity, floor").eq("product_name", product_name).execute()
-                    natural_response = self.get_natural_response_from_data(command, action, data[1])
-                    self.chat_display.append(tmpl.generate_gemini_message(natural_response))
-                    continue
-
-                elif action in ["show_purchase_logs", "query_employees"]:
-                    if action == "show_purchase_logs":
-                        self.chat_display.append(tmpl.generate_system_message("최근 구매 로그를 조회합니다..."))
-                        response = self.supabase.rpc('get_purchase_logs_kst').execute()
-                        html_table = tmpl.generate_purchase_logs_html(response.data)
-                    else:
-                        self.chat_display.append(tmpl.generate_system_message("직원 목록을 조회합니다..."))
-                        response = self.supabase.table("employees").select("employee_id, name, role").execute()
-                        html_table = tmpl.generate_employees_html(response.data)
-                    
-                    natural_response = self.get_natural_response_from_data(command, action, response.data)
-                    self.chat_display.append(tmpl.generate_gemini_message(natural_response))
-                    self.chat_display.append(html_table)
-                    continue
-                
-                elif action == "decrement":
-                    product_name = payload.get("name")
-                    floor = payload.get("floor")
-                    change_quantity = payload.get("quantity", 0)
-                    if not all([product_name, floor, change_quantity > 0]):
-                        execution_results.append({"action": action, "status": "fail", "reason": "제품명, 층, 수량 정보 누락"})
-                        continue
-                    
-                    try:
-                        data, _ = self.supabase.table("inventory").select("item_id, quantity").eq("product_name", product_name).eq("floor", floor).single().execute()
-                        item_id = data[1]['item_id']
-                        current_quantity = data[1]['quantity']
-
-                        if current_quantity < change_quantity:
-                            execution_results.append({"action": action, "product_name": product_name, "floor": floor, "status": "fail", "reason": f"재고 부족 (현재 {current_quantity}개)"})
-                            continue
-                        
-                        new_quantity = current_quantity - change_quantity
-                        self.supabase.table("inventory").update({"quantity": new_quantity}).eq("product_name", product_name).eq("floor", floor).execute()
-                        self.supabase.table("purchase_logs").insert({"employee_id": self.employee_id, "item_id": item_id, "product_name": product_name, "quantity": change_quantity}).execute()
-                        execution_results.append({"action": action, "product_name": product_name, "floor": floor, "quantity": change_quantity, "status": "success"})
-                        update_required = True
-                    except Exception as e:
-                        execution_results.append({"action": action, "product_name": product_name, "floor": floor, "status": "fail", "reason": f"DB 오류: {e}"})
-
-                elif action == "increment":
-                    product_name = payload.get("name")
-                    floor = payload.get("floor")
-                    change_quantity = payload.get("quantity", 0)
-                    if not all([product_name, floor, change_quantity > 0]):
-                        execution_results.append({"action": action, "status": "fail", "reason": "제품명, 층, 수량 정보 누락"})
-                        continue
-                    
-                    try:
-                        data, _ = self.supabase.table("inventory").select("id, quantity").eq("product_name", product_name).eq("floor", floor).single().execute()
-                        current_quantity = data[1]['quantity'] if data[1] else 0
-                        new_quantity = current_quantity + change_quantity
-                        
-                        if not data[1]:
-                            self.supabase.table("inventory").insert({"product_name": product_name, "quantity": new_quantity, "floor": floor}).execute()
-                        else:
-                            self.supabase.table("inventory").update({"quantity": new_quantity}).eq("product_name", product_name).eq("floor", floor).execute()
-                        
-                        execution_results.append({"action": action, "product_name": product_name, "floor": floor, "quantity": change_quantity, "status": "success"})
-                        update_required = True
-                    except Exception as e:
-                        execution_results.append({"action": action, "product_name": product_name, "floor": floor, "status": "fail", "reason": f"DB 오류: {e}"})
-
-                elif action == "delete_item":
-                    product_name = payload.get("name")
-                    floor = payload.get("floor")
-                    if not all([product_name, floor]):
-                        execution_results.append({"action": action, "status": "fail", "reason": "제품명, 층 정보 누락"})
-                        continue
-                    
-                    try:
-                        data, _ = self.supabase.table("inventory").delete().eq("product_name", product_name).eq("floor", floor).execute()
-                        if data[1]:
-                            execution_results.append({"action": action, "product_name": product_name, "floor": floor, "status": "success"})
-                            update_required = True
-                        else:
-                            execution_results.append({"action": action, "product_name": product_name, "floor": floor, "status": "fail", "reason": "삭제할 아이템을 찾지 못함"})
-                    except Exception as e:
-                        execution_results.append({"action": action, "product_name": product_name, "floor": floor, "status": "fail", "reason": f"DB 오류: {e}"})
-
-                elif action == "add_employee":
-                    pass
-
-                elif action == "delete_employee":
-                    pass
-
-                elif action == "error":
-                    error_message = payload.get("message", "알 수 없는 오류입니다.")
-                    self.chat_display.append(tmpl.generate_system_message(f"{error_message}", is_error=True))
+                emit({"type": "error", "text": f"{error_prefix}: {e}"})
+            finally:
+                self.engine_event.emit(finish, None)
+        self.engine_executor.submit(run)
+
+    def _dispatch_engine_event(self, render, event):
+        render(event)
+
+    def _run_ui_tasks(self, tasks: list):
+        """엔진이 넘겨준 화면 전용 작업을 실행 (권한 확인은 엔진에서 끝남)"""
+        handlers = self._ui_handlers()
+        for task in tasks:
+            try:
+                result = handlers[task["action"]](task)
+            except Exception as e:
+                self.chat_display.append(tmpl.generate_system_message(f"처리 중 오류가 발생했습니다: {e}", is_error=True))
+                continue
+            if result is not None:
+                self.render_engine_event(describe_result(result))
+
+    def _ui_handlers(self) -> dict:
+        """엔진 대신 이 화면에서 실행하는 작업 (command_engine.UI_ACTIONS)"""
+        return {
+            "bulk_restock": self._run_bulk_restock,
+            "export_inventory": lambda task: self.handle_export_inventory(),
+            "bulk_add_employees": lambda task: self.handle_bulk_add_employees(),
+            "settlement_report": self.handle_settlement_report,
+            "add_employee": self._run_add_employee,
+            "delete_employee": self._run_delete_employee,
+        }
+
+    def render_engine_event(self, event: dict):
+        """CommandEngine 이벤트를 채팅창/재고 표시에 반영"""
+        event_type = event.get("type")
+        if event_type == "reply":
+            self.chat_display.append(tmpl.generate_gemini_message(event["text"]))
+        elif event_type == "system":
+            self.chat_display.append(tmpl.generate_system_message(event["text"]))
+        elif event_type == "error":
+            self.chat_display.append(tmpl.generate_system_message(event["text"], is_error=True))
+        elif event_type == "table":
+            if event["kind"] == "show_purchase_logs":
+                self.chat_display.append(tmpl.generate_purchase_logs_html(event["data"]))
+            else:
+                self.chat_display.append(tmpl.generate_employees_html(event["data"]))
+        elif event_type == "refresh":
+            self.update_inventory_displays()
+        elif event_type == "alert":
+            self.chat_display.append(tmpl.generate_system_message(
+                f"[재고 부족] {event['floor']}층 {event['product_name']} 남은 수량 {event['quantity']}개 (기준 {event['threshold']}개)",
+                is_error=True,
+            ))
+
+    def _run_bulk_restock(self, task):
+        if self.handle_bulk_restock():
+            self.update_inventory_displays()
+
+    def _run_add_employee(self, task):
+        action = task.get("action")
+        payload = task.get("payload", {})
+        employee_id = str(payload.get("employee_id", "")).strip().upper()
+        try:
+            message = bulk_employees.add_employee(self.supabase, self.get_admin_client(), employee_id,
+                                                  payload.get("name"), payload.get("password"), payload.get("role", ""))
+            return {"action": action, "employee_id": employee_id, "name": payload.get("name"), "status": "success", "message": message}
+        except Exception as e:
+            return {"action": action, "employee_id": employee_id, "status": "fail", "reason": str(e)}
 
-                else:
-                    self.chat_display.append(tmpl.generate_gemini_message(response_text))
-
-            if execution_results:
-                natural_response = self.get_natural_response_from_data(
-                    original_command=command,
-                    action="multiple_operations",
-                    db_data=execution_results
-                )
-                self.chat_display.append(tmpl.generate_gemini_message(natural_response))
-            
-            if update_required:
-                self.update_inventory_displays()
+    def _run_delete_employee(self, task):
+        action = task.get("action")
+        payload = task.get("payload", {})
+        employee_id_to_delete = payload.get("employee_id")
+        name = payload.get("name")
+        if not employee_id_to_delete and not name:
+            return {"action": action, "status": "fail", "reason": "사번 또는 이름 정보 누락"}
 
+        try:
+            message = bulk_employees.delete_employee(self.supabase, self.get_admin_client(), employee_id_to_delete, name)
+            return {"action": action, "employee_id": employee_id_to_delete, "name": name, "status": "success", "message": message}
         except Exception as e:
-            self.chat_display.append(tmpl.generate_system_message(f"처리 중 오류가 발생했습니다: {e}", is_error=True))
+            return {"action": action, "employee_id": employee_id_to_delete, "name": name, "status": "fail", "reason": str(e)}
 
 def main(user_session: Session):
     app = QApplication.instance()
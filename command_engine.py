@@ -0,0 +1,528 @@
+"""
+자연어 명령 처리 엔진 (Gemini 파싱 -> DB 실행 -> Gemini 응답 생성)
+GUI와 로컬 HTTP 서비스가 같은 로직을 공유하도록 UI와 무관하게 작성되어 있습니다.
+처리 과정은 emit(event) 콜백으로 전달되며, 이벤트는 JSON으로 직렬화할 수 있는 dict입니다.
+  {"type": "reply", "text": ...}    Gemini 응답
+  {"type": "system", "text": ...}   시스템 안내
+  {"type": "error", "text": ...}    오류 안내
+  {"type": "table", "kind": 액션명, "data": [...]}
+  {"type": "refresh"}               재고 표시를 새로 고쳐야 함
+  {"type": "alert", "product_name", "floor", "quantity", "threshold"}  재고 부족
+  {"type": "task", "task": {...}}   클라이언트 화면에서 실행해야 하는 작업 (공유 서비스가 넘겨줌)
+"""
+
+import copy
+import json
+import time
+import uuid
+import random
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from command_planner import optimize_plan, log_plan, PARALLEL_READ_ACTIONS
+from session_refresher import is_session_expired
+from gemini_scheduler import scheduler as gemini_scheduler
+from conversation import ConversationState
+from instrumentation import metrics
+
+ADMIN_ONLY_ACTIONS = [
+    "query_all", "query_one", "increment", "show_purchase_logs", "delete_item",
+    "add_employee", "delete_employee", "query_employees",
+    "bulk_restock", "export_inventory", "bulk_add_employees", "settlement_report",
+]
+MUTATING_ACTIONS = ["decrement", "increment", "delete_item"]
+# 파일 선택 창이나 service role 키가 필요해 엔진 대신 화면(handlers)에서 실행하는 작업
+UI_ACTIONS = ["add_employee", "delete_employee", "bulk_restock", "export_inventory", "bulk_add_employees", "settlement_report"]
+MAX_PARALLEL_READS = 4
+# 재고 수량은 읽은 값이 그대로일 때만 바꾸고(compare-and-set), 그 사이 다른 사용자가 바꿨으면 다시 읽어 재시도
+MAX_UPDATE_RETRIES = 10
+UPDATE_RETRY_BACKOFF = 0.005  # 초. 재시도마다 0~(횟수 x 이 값) 사이 무작위 대기
+
+
+def is_unique_violation(e: Exception) -> bool:
+    """동시에 같은 (제품명, 층)을 추가하다 유니크 인덱스에 걸린 경우"""
+    message = str(e)
+    return "23505" in message or "duplicate key" in message
+
+
+def wait_before_retry(attempt: int):
+    metrics.incr("engine.update_conflicts")
+    time.sleep(random.uniform(0, UPDATE_RETRY_BACKOFF * (attempt + 1)))
+
+
+def add_stock(supabase, product_name: str, floor, change_quantity: int):
+    """
+    compare-and-set으로 재고에 수량을 더함 (행이 없으면 추가). apply_stock_change RPC가 없는 DB용
+    반환: 반영 후 수량. 다른 사용자와 계속 겹쳐 반영하지 못하면 None
+    """
+    for attempt in range(MAX_UPDATE_RETRIES):
+        response = supabase.table("inventory").select("id, quantity").eq("product_name", product_name).eq("floor", floor).execute()
+        current_quantity = response.data[0]['quantity'] if response.data else 0
+        new_quantity = current_quantity + change_quantity
+
+        if not response.data:
+            try:
+                inserted = supabase.table("inventory").insert({"product_name": product_name, "quantity": new_quantity, "floor": floor}).execute()
+                # item_id는 새로 추가된 행의 id와 같게 맞춤 (구매 로그/정산이 item_id로 층을 찾음)
+                if inserted.data:
+                    supabase.table("inventory").update({"item_id": inserted.data[0]["id"]}).eq("id", inserted.data[0]["id"]).execute()
+                applied = True
+            except Exception as e:
+                # 다른 사용자가 먼저 추가했으면 갱신으로 재시도
+                if not is_unique_violation(e):
+                    raise
+                applied = False
+        else:
+            updated = supabase.table("inventory").update({"quantity": new_quantity}).eq("product_name", product_name).eq("floor", floor).eq("quantity", current_quantity).execute()
+            applied = bool(updated.data)
+        if applied:
+            return new_quantity
+        wait_before_retry(attempt)
+    return None
+
+
+# 재고 변경은 멱등 키와 함께 apply_stock_change RPC(query.md)로 보내므로,
+# 응답을 받지 못한 요청도 같은 키로 바로 다시 보낼 수 있음 (이미 반영됐으면 저장된 결과가 돌아옴)
+MAX_WRITE_ATTEMPTS = 5
+# 요청 키별로 처음 해석한 작업 목록을 보관하는 개수 (다시 보낸 요청은 다시 해석하지 않음)
+MAX_CACHED_PLANS = 256
+WRITE_RETRY_BACKOFF = 0.1  # 초. 재시도마다 횟수 x 이 값만큼 대기
+TRANSIENT_ERROR_NAMES = (
+    "TimeoutException", "ConnectTimeout", "ReadTimeout", "WriteTimeout", "PoolTimeout",
+    "ConnectError", "ReadError", "WriteError", "RemoteProtocolError",
+)
+
+
+def is_transient_error(e: Exception) -> bool:
+    """요청이 반영됐는지 알 수 없는 네트워크 오류/시간 초과"""
+    return isinstance(e, (TimeoutError, ConnectionError)) or type(e).__name__ in TRANSIENT_ERROR_NAMES
+
+
+def is_missing_function(e: Exception) -> bool:
+    """DB에 RPC가 아직 만들어지지 않은 경우"""
+    message = str(e)
+    return "PGRST202" in message or "Could not find the function" in message or "알 수 없는 RPC" in message
+
+
+def is_idempotency_conflict(e: Exception) -> bool:
+    """같은 멱등 키가 이미 다른 작업(제품/층/수량)에 쓰인 경우"""
+    return "idempotency key reused" in str(e)
+
+
+def assign_idempotency_keys(stages: list, request_key: str = None):
+    """
+    변경 작업마다 멱등 키를 붙임 (이미 있으면 유지)
+    request_key를 주면 "요청 키:순번"으로 만들어, 같은 요청을 다시 보내도 같은 키가 됨
+    키는 순번으로 정해지므로 같은 요청 키에는 같은 작업 목록을 써야 함 (CommandEngine.run이 처음 해석한 목록을 재사용)
+    """
+    base = request_key or uuid.uuid4().hex
+    index = 0
+    for stage in stages:
+        for task in stage:
+            if task.get("action") in MUTATING_ACTIONS:
+                task.setdefault("idempotency_key", f"{base}:{index}")
+            index += 1
+
+
+def build_system_prompt(cfg: dict, is_admin: bool) -> str:
+    """prompts.toml 설정과 역할로 시스템 프롬프트를 생성"""
+    system_prompt = cfg["base_prompt"]
+    if is_admin:
+        system_prompt += cfg["admin_actions"] + cfg["common_actions"].replace("- 'decrement'", "13. 'decrement'")
+    else:
+        system_prompt += cfg["common_actions"].replace("- 'decrement'", "1. 'decrement'")
+    return system_prompt
+
+
+def parse_tasks(response_text: str) -> list:
+    """Gemini 응답 텍스트를 작업 목록으로 변환. JSON이 아니면 json.JSONDecodeError"""
+    response_text = response_text.strip()
+    # Gemini 응답에서 Markdown 코드 블록 마커 제거
+    if response_text.startswith('```json'):
+        response_text = response_text.lstrip('```json').strip()
+    if response_text.endswith('```'):
+        response_text = response_text.rstrip('```').strip()
+
+    # 응답이 배열 형태일 경우
+    if response_text.startswith('['):
+        return json.loads(response_text)
+    # 응답이 단일 객체 형태일 경우
+    if response_text.startswith('{'):
+        return [json.loads(response_text)]
+    # Gemini가 여러 객체를 배열 없이 반환한 경우 (예: }{)를 처리
+    # 이 부분은 Gemini가 프롬프트 지시를 따르지 않을 때의 방어 로직
+    return json.loads(f"[{response_text.replace('}{', '},{')}]")
+
+
+def describe_result(result: dict) -> dict:
+    """변경 작업 결과 하나를 Gemini 없이 안내하는 이벤트로 변환"""
+    action = result.get("action")
+    if action in ("add_employee", "delete_employee"):
+        target = result.get("employee_id") or result.get("name") or ""
+        if result.get("status") != "success":
+            return {"type": "error", "text": f"{target}: {result.get('reason', '처리하지 못했습니다.')}"}
+        if action == "add_employee":
+            return {"type": "system", "text": f"임직원 {target}({result.get('name', '')}) 등록 완료"}
+        return {"type": "system", "text": result.get("message") or f"임직원 {target} 삭제 완료"}
+
+    if result.get("status") != "success":
+        target = f"{result['floor']}층 {result['product_name']}: " if result.get("product_name") else ""
+        return {"type": "error", "text": f"{target}{result.get('reason', '처리하지 못했습니다.')}"}
+
+    target = f"{result['floor']}층 {result['product_name']}"
+    if action == "decrement":
+        return {"type": "system", "text": f"{target} {result['quantity']}개 차감 (남은 수량 {result['new_quantity']}개)"}
+    if action == "increment":
+        return {"type": "system", "text": f"{target} {result['quantity']}개 입고 (현재 {result['new_quantity']}개)"}
+    if action == "delete_item":
+        return {"type": "system", "text": f"{target} 삭제 완료"}
+    return {"type": "system", "text": f"'{action}' 처리 완료"}
+
+
+class CommandEngine:
+    def __init__(self, supabase, gemini_model, employee_id: str, is_admin: bool, system_prompt: str):
+        self.supabase = supabase
+        self.gemini_model = gemini_model
+        self.employee_id = employee_id
+        self.is_admin = is_admin
+        self.system_prompt = system_prompt
+        self.conversation = ConversationState()
+        # LowStockMonitor를 지정하면 재고 변경 후 기준 이하로 떨어진 품목을 "alert" 이벤트로 알림
+        self.stock_monitor = None
+        # SessionRefresher를 지정하면 세션 만료로 실패한 DB 작업을 갱신 후 재시도
+        self.session_guard = None
+        # apply_stock_change RPC가 없는 DB에서는 compare-and-set으로 직접 갱신 (멱등 보장 없음)
+        self.use_stock_rpc = True
+        # 요청 키 -> (명령, 작업 목록, 응답 문장). 다시 보낸 요청이 Gemini 해석 결과가 달라져 다른 작업을 같은 키로 보내지 않도록
+        self.plans = OrderedDict()
+
+    def parse(self, command: str, context: str = ""):
+        """
+        자연어 명령을 작업 목록으로 변환
+        context: 프롬프트에 덧붙일 이전 대화 (ConversationState.context_prompt)
+        반환: (tasks, response_text) - Gemini가 JSON 대신 질문 등을 돌려준 경우 tasks는 None
+        """
+        full_prompt = self.system_prompt + context + "\n사용자 요청: " + command
+        response_text = gemini_scheduler.generate(self.gemini_model, full_prompt).strip()
+        try:
+            return parse_tasks(response_text), response_text
+        except json.JSONDecodeError:
+            return None, response_text
+
+    def narrate(self, original_command: str, action: str, db_data) -> str:
+        """DB에서 받은 데이터를 바탕으로 Gemini를 호출하여 자연어 응답을 생성"""
+        response_generation_prompt = f'''
+        사용자의 원래 요청: '{original_command}'
+        수행된 작업: '{action}'
+        데이터베이스 결과: {json.dumps(db_data, ensure_ascii=False, default=str)}
+
+        위 정보를 바탕으로 사용자에게 전달할 친절하고 자연스러운 응답 메시지를 한 문장으로 생성해줘.
+        '''
+        return gemini_scheduler.generate(self.gemini_model, response_generation_prompt)
+
+    def _emit_narration(self, emit, original_command: str, action: str, db_data):
+        try:
+            emit({"type": "reply", "text": self.narrate(original_command, action, db_data)})
+        except Exception as e:
+            emit({"type": "error", "text": f"응답 생성 중 오류 발생: {e}"})
+
+    def execute_task(self, task: dict) -> dict:
+        """
+        DB 작업 하나를 실행하고 결과를 반환
+        반환: {"action", "status": "success" | "fail", ...} (조회 작업은 "data" 포함)
+        """
+        action = task.get("action")
+        payload = task.get("payload", {})
+
+        if action in ADMIN_ONLY_ACTIONS and not self.is_admin:
+            return {"action": action, "status": "fail", "reason": "권한 없음"}
+
+        if action == "query_all":
+            response = self.supabase.table("inventory").select("product_name, quantity, floor").order("floor").order("product_name").execute()
+            return {"action": action, "status": "success", "data": response.data}
+
+        if action == "query_one":
+            product_name = payload.get("name")
+            if not product_name:
+                return {"action": action, "status": "fail", "reason": "제품명이 명확하지 않습니다."}
+            query = self.supabase.table("inventory").select("product_name, quantity, floor").eq("product_name", product_name)
+            if payload.get("floor"):
+                query = query.eq("floor", payload["floor"])
+            return {"action": action, "status": "success", "data": query.execute().data}
+
+        if action == "show_purchase_logs":
+            return {"action": action, "status": "success", "data": self.supabase.rpc('get_purchase_logs_kst').execute().data}
+
+        if action == "query_employees":
+            response = self.supabase.table("employees").select("employee_id, name, role").execute()
+            return {"action": action, "status": "success", "data": response.data}
+
+        if action == "decrement":
+            product_name = payload.get("name")
+            floor = payload.get("floor")
+            change_quantity = payload.get("quantity", 0)
+            if not all([product_name, floor, change_quantity > 0]):
+                return {"action": action, "status": "fail", "reason": "제품명, 층, 수량 정보 누락"}
+
+            try:
+                if self.use_stock_rpc:
+                    result = self._apply_stock_change(task, product_name, floor, change_quantity)
+                    if result is not None:
+                        return result
+                for attempt in range(MAX_UPDATE_RETRIES):
+                    response = self.supabase.table("inventory").select("item_id, quantity").eq("product_name", product_name).eq("floor", floor).execute()
+                    if not response.data:
+                        return {"action": action, "product_name": product_name, "floor": floor, "status": "fail", "reason": "해당 층에 없는 제품"}
+                    item_id = response.data[0]['item_id']
+                    current_quantity = response.data[0]['quantity']
+
+                    if current_quantity < change_quantity:
+                        return {"action": action, "product_name": product_name, "floor": floor, "status": "fail", "reason": f"재고 부족 (현재 {current_quantity}개)"}
+
+                    new_quantity = current_quantity - change_quantity
+                    updated = self.supabase.table("inventory").update({"quantity": new_quantity}).eq("product_name", product_name).eq("floor", floor).eq("quantity", current_quantity).execute()
+                    if updated.data:
+                        self.supabase.table("purchase_logs").insert({"employee_id": self.employee_id, "item_id": item_id, "product_name": product_name, "quantity": change_quantity}).execute()
+                        return {"action": action, "product_name": product_name, "floor": floor, "quantity": change_quantity, "new_quantity": new_quantity, "status": "success"}
+                    wait_before_retry(attempt)
+                return {"action": action, "product_name": product_name, "floor": floor, "status": "fail", "reason": "다른 사용자와 동시에 변경되어 처리하지 못했습니다. 다시 시도해주세요."}
+            except Exception as e:
+                if is_session_expired(e):
+                    raise
+                return {"action": action, "product_name": product_name, "floor": floor, "status": "fail", "reason": f"DB 오류: {e}"}
+
+        if action == "increment":
+            product_name = payload.get("name")
+            floor = payload.get("floor")
+            change_quantity = payload.get("quantity", 0)
+            if not all([product_name, floor, change_quantity > 0]):
+                return {"action": action, "status": "fail", "reason": "제품명, 층, 수량 정보 누락"}
+
+            try:
+                if self.use_stock_rpc:
+                    result = self._apply_stock_change(task, product_name, floor, change_quantity)
+                    if result is not None:
+                        return result
+                new_quantity = add_stock(self.supabase, product_name, floor, change_quantity)
+                if new_quantity is not None:
+                    return {"action": action, "product_name": product_name, "floor": floor, "quantity": change_quantity, "new_quantity": new_quantity, "status": "success"}
+                return {"action": action, "product_name": product_name, "floor": floor, "status": "fail", "reason": "다른 사용자와 동시에 변경되어 처리하지 못했습니다. 다시 시도해주세요."}
+            except Exception as e:
+                if is_session_expired(e):
+                    raise
+                return {"action": action, "product_name": product_name, "floor": floor, "status": "fail", "reason": f"DB 오류: {e}"}
+
+        if action == "delete_item":
+            product_name = payload.get("name")
+            floor = payload.get("floor")
+            if not all([product_name, floor]):
+                return {"action": action, "status": "fail", "reason": "제품명, 층 정보 누락"}
+
+            try:
+                response = self.supabase.table("inventory").delete().eq("product_name", product_name).eq("floor", floor).execute()
+                if response.data:
+                    return {"action": action, "product_name": product_name, "floor": floor, "new_quantity": None, "status": "success"}
+                return {"action": action, "product_name": product_name, "floor": floor, "status": "fail", "reason": "삭제할 아이템을 찾지 못함"}
+            except Exception as e:
+                if is_session_expired(e):
+                    raise
+                return {"action": action, "product_name": product_name, "floor": floor, "status": "fail", "reason": f"DB 오류: {e}"}
+
+        return {"action": action, "status": "fail", "reason": f"알 수 없는 action '{action}'"}
+
+    def _apply_stock_change(self, task: dict, product_name: str, floor, change_quantity: int):
+        """
+        멱등 키와 함께 재고를 한 번에 변경 (차감이면 구매 로그도 같은 트랜잭션에서 기록)
+        응답을 받지 못하면 같은 키로 재시도. RPC가 없는 DB면 None을 반환
+        """
+        action = task["action"]
+        key = task.setdefault("idempotency_key", uuid.uuid4().hex)
+        params = {
+            "p_key": key, "p_action": action, "p_product_name": product_name,
+            "p_floor": floor, "p_quantity": change_quantity,
+        }
+        for attempt in range(MAX_WRITE_ATTEMPTS):
+            try:
+                outcome = self.supabase.rpc("apply_stock_change", params).execute().data
+                break
+            except Exception as e:
+                if is_missing_function(e):
+                    self.use_stock_rpc = False
+                    metrics.incr("engine.stock_rpc_missing")
+                    return None
+                if is_idempotency_conflict(e):
+                    metrics.incr("engine.idempotency_conflicts")
+                    return {"action": action, "product_name": product_name, "floor": floor, "idempotency_key": key,
+                            "status": "fail", "reason": "같은 요청 키로 이미 다른 작업이 처리되었습니다. 다시 요청해주세요."}
+                if not is_transient_error(e) or attempt == MAX_WRITE_ATTEMPTS - 1:
+                    raise
+                metrics.incr("engine.write_retries")
+                time.sleep(WRITE_RETRY_BACKOFF * (attempt + 1))
+
+        if outcome.get("replayed"):
+            metrics.incr("engine.idempotent_replays")
+        result = {"action": action, "product_name": product_name, "floor": floor, "idempotency_key": key}
+        if outcome.get("status") == "success":
+            result.update(status="success", quantity=change_quantity, new_quantity=outcome["new_quantity"])
+        else:
+            result.update(status="fail", reason=outcome.get("reason", "처리하지 못했습니다."))
+        return result
+
+    def _execute(self, task: dict) -> dict:
+        if self.session_guard is None:
+            return self.execute_task(task)
+        return self.session_guard.call(self.execute_task, task)
+
+    def _check_stock(self, result: dict, emit):
+        if self.stock_monitor is None:
+            return
+        alert = self.stock_monitor.observe(result["product_name"], result["floor"], result.get("new_quantity"))
+        if alert:
+            emit({"type": "alert", **alert})
+
+    def _run_read(self, command: str, task: dict) -> list:
+        """조회 작업 하나를 실행하고 내보낼 이벤트 목록을 반환 (동시 실행용)"""
+        action = task.get("action")
+        events = []
+        if action == "show_purchase_logs":
+            events.append({"type": "system", "text": "최근 구매 로그를 조회합니다..."})
+        elif action == "query_employees":
+            events.append({"type": "system", "text": "직원 목록을 조회합니다..."})
+
+        result = self._execute(task)
+        if result["status"] != "success":
+            events.append({"type": "error", "text": result["reason"]})
+            return events
+
+        self._emit_narration(events.append, command, action, result["data"])
+        if action != "query_one":
+            events.append({"type": "table", "kind": action, "data": result["data"]})
+        return events
+
+    def _remember_plan(self, request_key: str, command: str, tasks, response_text):
+        self.plans[request_key] = (command, copy.deepcopy(tasks), response_text)
+        while len(self.plans) > MAX_CACHED_PLANS:
+            self.plans.popitem(last=False)
+
+    def run(self, command: str, emit, tasks: list = None, handlers: dict = None, narrate: bool = True, request_key: str = None):
+        """
+        명령 하나를 끝까지 처리
+        tasks를 주면 Gemini 파싱을 건너뜀
+        narrate=False이면 변경 결과를 Gemini 응답 대신 짧은 시스템 안내로 알림 (바코드 스캔 등)
+        tasks를 주거나 narrate=False인 실행은 대화 상태를 바꾸지 않음 (되묻는 중인 질문이 그대로 남음)
+        request_key: 클라이언트가 만든 요청 키. 같은 키로 다시 보낸 요청의 변경 작업은 한 번만 반영됨
+                     (다시 보낸 명령은 Gemini로 다시 해석하지 않고 처음 해석한 작업 목록을 사용)
+        handlers: {액션명: handler(task) -> 결과 dict 또는 None} - 엔진이 모르는 UI 전용 액션 처리
+                  결과 dict를 반환하면 다른 변경 작업 결과와 함께 응답 생성에 사용됨
+        """
+        handlers = handlers or {}
+        response_text = None
+        conversation = self.conversation
+        # 대화 상태(되묻는 중인 질문, 대화 기록)는 사용자가 입력한 문장을 해석한 경우에만 바꿈
+        # 바코드 스캔(narrate=False)이나 tasks로 받은 요청이 답을 기다리는 질문을 지우지 않도록
+        track = tasks is None and narrate
+        cached = self.plans.get(request_key) if request_key and tasks is None else None
+        if cached is not None and cached[0] == command:
+            # 같은 요청을 다시 보낸 경우: 다시 해석하면 (이미 바뀐 대화 상태 때문에) 다른 작업이 같은 멱등 키를 받을 수 있으므로
+            # 처음 해석한 작업을 그대로 쓰고, 대화 상태도 다시 바꾸지 않음
+            tasks, response_text = copy.deepcopy(cached[1]), cached[2]
+            track = False
+            metrics.incr("engine.plan_replays")
+        elif tasks is None:
+            # "2층"처럼 되물은 질문에 대한 짧은 답은 Gemini 호출 없이 보관된 작업으로 완성
+            tasks = conversation.try_complete(command) if track else None
+            if tasks is not None:
+                metrics.incr("conversation.local_completions")
+            else:
+                tasks, response_text = self.parse(command, conversation.context_prompt() if track else "")
+            if request_key:
+                self._remember_plan(request_key, command, tasks, response_text)
+
+        if track:
+            conversation.add_turn("user", command)
+        if tasks is None:
+            # JSON이 아니면 Gemini가 사용자에게 되묻는 문장
+            if track:
+                conversation.set_pending(command)
+                conversation.add_turn("assistant", response_text)
+            emit({"type": "reply", "text": response_text})
+            return
+
+        clarify = next((t for t in tasks if t.get("action") == "clarify"), None)
+        if clarify:
+            payload = clarify.get("payload", {})
+            if track:
+                conversation.set_pending(command, payload.get("pending"))
+                conversation.add_turn("assistant", payload.get("message", ""))
+            emit({"type": "reply", "text": payload.get("message", "어느 층의 재고인지 알려주세요.")})
+            tasks = [t for t in tasks if t.get("action") != "clarify"]
+            if not tasks:
+                return
+        elif track:
+            conversation.clear_pending()
+            conversation.add_turn("assistant", ", ".join(str(t.get("action")) for t in tasks))
+
+        stages, plan_stats = optimize_plan(tasks)
+        log_plan(tasks, stages, plan_stats)
+        assign_idempotency_keys(stages, request_key)
+
+        execution_results = []
+        update_required = False
+
+        for stage in stages:
+            # 권한 없는 작업은 실행 전에 걸러냄
+            allowed = []
+            for task in stage:
+                if task.get("action") in ADMIN_ONLY_ACTIONS and not self.is_admin:
+                    emit({"type": "error", "text": "이 명령을 실행할 권한이 없습니다."})
+                else:
+                    allowed.append(task)
+
+            if len(allowed) > 1:
+                # 독립된 조회 단계: 동시에 실행하고 결과는 원래 순서대로 표시
+                with ThreadPoolExecutor(max_workers=min(len(allowed), MAX_PARALLEL_READS)) as executor:
+                    for events in executor.map(lambda t: self._run_read(command, t), allowed):
+                        for event in events:
+                            emit(event)
+                continue
+
+            for task in allowed:
+                action = task.get("action")
+
+                if action in handlers:
+                    result = handlers[action](task)
+                    if result is not None:
+                        execution_results.append(result)
+
+                elif action == "query_all":
+                    update_required = True
+                    emit({"type": "system", "text": "재고 현황을 새로고침했습니다."})
+
+                elif action in PARALLEL_READ_ACTIONS:
+                    for event in self._run_read(command, task):
+                        emit(event)
+
+                elif action in MUTATING_ACTIONS:
+                    result = self._execute(task)
+                    execution_results.append(result)
+                    if result["status"] == "success":
+                        update_required = True
+                        self._check_stock(result, emit)
+
+                elif action == "error":
+                    emit({"type": "error", "text": task.get("payload", {}).get("message", "알 수 없는 오류입니다.")})
+
+                elif action in ADMIN_ONLY_ACTIONS:
+                    emit({"type": "error", "text": f"'{action}' 명령은 이 화면에서 지원하지 않습니다."})
+
+                else:
+                    emit({"type": "reply", "text": response_text or f"알 수 없는 명령입니다: {action}"})
+
+        if execution_results:
+            if narrate:
+                self._emit_narration(emit, command, "multiple_operations", execution_results)
+            else:
+                for result in execution_results:
+                    emit(describe_result(result))
+
+        if update_required:
+            emit({"type": "refresh"})
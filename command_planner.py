@@ -0,0 +1,119 @@
+"""
+Gemini가 만든 작업 목록을 실행 전에 최적화
+  - 같은 (제품, 층)에 대한 연속된 increment는 수량을 합쳐 한 번에 처리
+    (decrement는 합치지 않음: 재고 5개에 3개씩 두 번 차감하면 하나는 성공해야 하는데, 6개로 합치면 둘 다 실패함)
+  - 같은 delete_item, 같은 query_one의 반복은 한 번만 실행
+  - 반복된 query_all은 한 번만 실행 (변경 작업이 모두 실패할 수도 있으므로 변경 작업이 있어도 남겨 둠)
+  - 서로 독립적인 조회 작업은 하나의 단계로 묶어 동시에 실행
+결과는 단계(stage) 목록이며, 각 단계는 동시에 실행해도 되는 작업들의 목록입니다.
+"""
+
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+MERGEABLE_ACTIONS = ["increment"]
+PARALLEL_READ_ACTIONS = ["query_one", "show_purchase_logs", "query_employees"]
+
+
+def _product_key(task: dict):
+    payload = task.get("payload", {})
+    return payload.get("name"), payload.get("floor")
+
+
+def _touches(read_key, mutation_key) -> bool:
+    """조회 (제품, 층)이 변경 작업 대상과 겹치는지. 층 없는 조회는 모든 층과 겹침"""
+    read_name, read_floor = read_key
+    name, floor = mutation_key
+    return read_name == name and (read_floor is None or read_floor == floor)
+
+
+def optimize_plan(tasks: list):
+    """
+    반환: (stages, stats)
+      stages - [[task, ...], ...] 앞 단계부터 순서대로, 단계 안의 작업은 동시에 실행 가능
+      stats  - {"before", "after", "merged", "dropped", "stages"}
+    """
+    optimized = []
+    merge_targets = {}   # (action, 제품, 층) -> optimized 안의 작업 (아직 합칠 수 있는 것)
+    seen_reads = set()
+    seen_deletes = set()
+    merged = 0
+    dropped = 0
+
+    for task in tasks:
+        action = task.get("action")
+        key = _product_key(task)
+
+        if action == "query_all":
+            if "query_all" in seen_reads:
+                dropped += 1
+                continue
+            seen_reads.add("query_all")
+
+        elif action in MERGEABLE_ACTIONS:
+            quantity = task.get("payload", {}).get("quantity")
+            target = merge_targets.get((action, *key))
+            if target is not None and isinstance(quantity, int) and quantity > 0:
+                target["payload"]["quantity"] += quantity
+                merged += 1
+                continue
+            task = {**task, "payload": dict(task.get("payload", {}))}
+            if isinstance(quantity, int) and quantity > 0 and all(key):
+                merge_targets[(action, *key)] = task
+            seen_reads = {r for r in seen_reads if not (isinstance(r, tuple) and _touches(r[1:], key))}
+
+        elif action == "decrement":
+            # 차감 이후의 입고를 앞의 입고와 합치면 순서가 바뀌므로 더 이상 합치지 않음
+            merge_targets.pop(("increment", *key), None)
+            seen_reads = {r for r in seen_reads if not (isinstance(r, tuple) and _touches(r[1:], key))}
+
+        elif action == "delete_item":
+            if key in seen_deletes:
+                dropped += 1
+                continue
+            seen_deletes.add(key)
+            merge_targets = {k: v for k, v in merge_targets.items() if k[1:] != key}
+            seen_reads = {r for r in seen_reads if not (isinstance(r, tuple) and _touches(r[1:], key))}
+
+        elif action == "query_one":
+            read_key = ("query_one", *key)
+            if read_key in seen_reads:
+                dropped += 1
+                continue
+            seen_reads.add(read_key)
+            # 조회 이후의 변경은 조회 결과에 영향을 주므로 앞의 변경과 합치지 않음
+            merge_targets = {k: v for k, v in merge_targets.items() if not _touches(key, k[1:])}
+
+        elif action in PARALLEL_READ_ACTIONS:
+            if action in seen_reads:
+                dropped += 1
+                continue
+            seen_reads.add(action)
+
+        optimized.append(task)
+
+    # 연속된 독립 조회를 하나의 단계로 묶음
+    stages = []
+    for task in optimized:
+        if task.get("action") in PARALLEL_READ_ACTIONS and stages and stages[-1][0].get("action") in PARALLEL_READ_ACTIONS:
+            stages[-1].append(task)
+        else:
+            stages.append([task])
+
+    stats = {
+        "before": len(tasks),
+        "after": len(optimized),
+        "merged": merged,
+        "dropped": dropped,
+        "stages": len(stages),
+    }
+    return stages, stats
+
+
+def log_plan(tasks: list, stages: list, stats: dict):
+    logger.info("plan before (%d): %s", len(tasks), json.dumps(tasks, ensure_ascii=False))
+    logger.info("plan after (%d tasks, %d stages, merged %d, dropped %d): %s",
+                stats["after"], stats["stages"], stats["merged"], stats["dropped"],
+                json.dumps(stages, ensure_ascii=False))
@@ -0,0 +1,88 @@
+"""
+세션별 대화 상태
+층 정보가 빠져 Gemini가 되물은 경우 미완성 작업(pending)을 보관해 두었다가,
+다음 입력이 "2층"처럼 층만 알려주면 Gemini 호출 없이 바로 작업을 완성합니다.
+그 밖의 후속 입력에는 최근 대화를 짧게 덧붙여 다시 묻지 않아도 되게 합니다.
+대화 기록은 MAX_CONTEXT_CHARS 안에서만 유지되며, 넘치는 오래된 기록은 한 줄 요약으로 압축됩니다.
+"""
+
+import re
+from collections import deque
+
+MAX_CONTEXT_CHARS = 1200
+MAX_TURNS = 20
+SUMMARY_ITEM_CHARS = 20
+PENDING_ACTIONS = ["increment", "decrement", "delete_item"]
+
+FLOOR_ONLY_PATTERN = re.compile(r"^\s*(\d+)\s*층\s*(?:이요|입니다|이에요|에서요|요|이야|)\s*[.!~]*\s*$")
+
+
+class ConversationState:
+    def __init__(self, max_chars: int = MAX_CONTEXT_CHARS):
+        self.max_chars = max_chars
+        self.turns = deque(maxlen=MAX_TURNS)
+        self.summary = ""
+        self.pending_command = None
+        self.pending_tasks = None
+
+    @property
+    def has_pending(self) -> bool:
+        return self.pending_command is not None
+
+    def add_turn(self, role: str, text: str):
+        self.turns.append((role, " ".join(str(text).split())))
+        self._compact()
+
+    def _compact(self):
+        """기록이 max_chars를 넘으면 오래된 사용자 요청부터 요약 한 줄로 옮김"""
+        while len(self.turns) > 2 and self._size() > self.max_chars:
+            role, text = self.turns.popleft()
+            if role == "user":
+                item = text[:SUMMARY_ITEM_CHARS]
+                self.summary = f"{self.summary}, {item}" if self.summary else item
+        if len(self.summary) > self.max_chars // 4:
+            self.summary = "…" + self.summary[-(self.max_chars // 4):]
+
+    def _size(self) -> int:
+        return len(self.summary) + sum(len(text) + 8 for _, text in self.turns)
+
+    def set_pending(self, command: str, tasks: list = None):
+        """Gemini가 되물은 명령과 (있다면) 층이 빠진 작업 목록을 보관"""
+        self.pending_command = command
+        self.pending_tasks = [t for t in (tasks or []) if t.get("action") in PENDING_ACTIONS] or None
+
+    def clear_pending(self):
+        self.pending_command = None
+        self.pending_tasks = None
+
+    def try_complete(self, command: str):
+        """
+        보관된 작업을 후속 입력만으로 완성할 수 있으면 작업 목록을 반환, 아니면 None
+        """
+        if not self.pending_tasks:
+            return None
+        match = FLOOR_ONLY_PATTERN.match(command)
+        if not match:
+            return None
+
+        floor = int(match.group(1))
+        tasks = []
+        for task in self.pending_tasks:
+            payload = dict(task.get("payload", {}))
+            if not payload.get("floor"):
+                payload["floor"] = floor
+            tasks.append({"action": task["action"], "payload": payload})
+        self.clear_pending()
+        return tasks
+
+    def context_prompt(self) -> str:
+        """되묻는 중일 때만 프롬프트에 붙일 최근 대화. 아니면 빈 문자열"""
+        if not self.has_pending:
+            return ""
+        lines = ["\n이전 대화 (사용자의 새 요청은 아래 질문에 대한 답변일 수 있습니다. 이미 처리된 요청은 다시 처리하지 마세요):"]
+        if self.summary:
+            lines.append(f"(이전 요청 요약: {self.summary})")
+        for role, text in self.turns:
+            lines.append(f"{'사용자' if role == 'user' else '어시스턴트'}: {text}")
+        lines.append(f"답변을 기다리는 요청: {self.pending_command}")
+        return "\n".join(lines)
@@ -0,0 +1,76 @@
+"""
+engine_service.py 에 명령을 보내고 응답 이벤트를 받는 클라이언트
+"""
+
+import json
+import time
+import uuid
+import http.client
+from urllib.parse import urlparse
+
+
+SUBMIT_ATTEMPTS = 3  # 응답을 받기 전에 연결이 끊기면 같은 멱등 키로 다시 보냄
+SUBMIT_RETRY_BACKOFF = 0.5
+
+
+class EngineServiceError(Exception):
+    pass
+
+
+class EngineClient:
+    def __init__(self, base_url: str, access_token: str, refresh_token: str = None, timeout: float = 60):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.timeout = timeout
+
+    def submit(self, command: str = None, tasks: list = None, narrate: bool = True, idempotency_key: str = None):
+        """
+        명령을 보내고 이벤트 dict를 도착하는 순서대로 yield ("done" 이벤트 제외)
+        요청마다 멱등 키를 붙이므로, 응답 전에 연결이 끊겨 다시 보내도 재고 변경은 한 번만 반영됨
+        """
+        body = {"command": command} if tasks is None else {"command": command or "", "tasks": tasks}
+        if not narrate:
+            body["narrate"] = False
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.access_token}",
+            "Idempotency-Key": idempotency_key or uuid.uuid4().hex,
+        }
+        if self.refresh_token:
+            headers["X-Refresh-Token"] = self.refresh_token
+
+        for attempt in range(SUBMIT_ATTEMPTS):
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                connection.request("POST", "/v1/commands", body=json.dumps(body, ensure_ascii=False).encode("utf-8"), headers=headers)
+                response = connection.getresponse()
+                break
+            except (TimeoutError, ConnectionError, http.client.HTTPException):
+                connection.close()
+                if attempt == SUBMIT_ATTEMPTS - 1:
+                    raise
+                time.sleep(SUBMIT_RETRY_BACKOFF * (attempt + 1))
+
+        try:
+            if response.status != 200:
+                error = json.loads(response.read() or b"{}").get("error", response.reason)
+                raise EngineServiceError(f"서비스 오류 ({response.status}): {error}")
+
+            for line in response:
+                event = json.loads(line)
+                if event.get("type") == "done":
+                    break
+                yield event
+        finally:
+            connection.close()
+
+    def health(self) -> dict:
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request("GET", "/v1/health")
+            return json.loads(connection.getresponse().read())
+        finally:
+            connection.close()
@@ -0,0 +1,383 @@
+"""
+명령 처리 엔진을 여러 키오스크가 함께 쓰는 로컬 HTTP/JSON 서비스
+
+  POST /v1/commands   {"command": "2층 초코파이 1개 가져갑니다"} 또는 {"tasks": [...]}
+                      "narrate": false를 주면 변경 결과를 Gemini 응답 대신 시스템 안내로 받음
+                      Idempotency-Key: <키>를 주면 같은 키로 다시 보낸 요청의 재고 변경은 한 번만 반영
+                      Authorization: Bearer <access_token>, X-Refresh-Token: <refresh_token>
+                      응답은 엔진 이벤트를 한 줄에 하나씩 스트리밍 (application/x-ndjson)
+  GET  /v1/health     대기열/세션/처리량 상태
+
+파일 선택 등 화면에서만 할 수 있는 작업(command_engine.UI_ACTIONS)은 실행하지 않고 {"type": "task"} 이벤트로 돌려주며,
+클라이언트가 직접 실행합니다.
+
+요청은 대기열에 쌓이고 작업자 수만큼만 동시에 처리됩니다. 대기열이 가득 차면 503을 반환합니다.
+사용자별 Supabase 클라이언트(HTTP 연결 유지)와 Gemini 모델, 시스템 프롬프트는 요청 간에 재사용됩니다.
+
+실행: python engine_service.py [--local [--seed seed.json]]
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import tomllib
+import argparse
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from command_engine import CommandEngine, build_system_prompt, UI_ACTIONS
+from instrumentation import metrics
+from stock_alerts import load_monitor
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 64 * 1024
+
+# --local 실행 시 기본 데이터
+LOCAL_SEED = {
+    "employees": [
+        {"employee_id": "ADMIN", "name": "관리자", "role": "관리자"},
+        {"employee_id": "USER", "name": "사용자", "role": "일반"},
+    ],
+    "inventory": [
+        {"id": 1, "item_id": 1, "product_name": "초코파이", "quantity": 30, "floor": 2},
+        {"id": 2, "item_id": 2, "product_name": "쿠크다스", "quantity": 20, "floor": 2},
+        {"id": 3, "item_id": 3, "product_name": "초코파이", "quantity": 30, "floor": 3},
+        {"id": 4, "item_id": 4, "product_name": "몽쉘코코아", "quantity": 24, "floor": 3},
+    ],
+    "purchase_logs": [],
+}
+
+
+class _Session:
+    """풀에 보관하는 엔진과, 같은 세션의 요청을 하나씩 처리하기 위한 잠금"""
+
+    def __init__(self, engine: CommandEngine, access_token: str):
+        self.engine = engine
+        self.access_token = access_token
+        self.lock = threading.Lock()
+
+
+class SessionPool:
+    """
+    사용자별 CommandEngine 캐시 (LRU)
+    같은 사용자의 요청은 같은 Supabase 클라이언트를 재사용하여 연결을 유지합니다.
+    엔진의 대화 상태(ConversationState)는 스레드 안전하지 않으므로 같은 세션의 요청은 한 번에 하나씩 처리합니다.
+    토큰 갱신은 클라이언트(GUI)가 하므로, 같은 사용자가 새 access token으로 요청하면 기존 클라이언트의 세션만 바꿉니다.
+
+    factory: identify(access_token) -> 사용자 키, create(access_token, refresh_token) -> CommandEngine,
+             update(engine, access_token, refresh_token)
+    """
+
+    def __init__(self, factory, max_sessions: int = 64):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.users = OrderedDict()  # 확인된 access token -> 사용자 키
+        self.sessions = OrderedDict()  # 사용자 키 -> _Session
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def session(self, access_token: str, refresh_token: str = None):
+        """사용자의 엔진을 빌려 줌. 같은 사용자의 다른 요청이 끝날 때까지 기다림"""
+        entry = self._get(self._identify(access_token), access_token, refresh_token)
+        with entry.lock:
+            if entry.access_token != access_token:
+                self.factory.update(entry.engine, access_token, refresh_token)
+                entry.access_token = access_token
+                metrics.incr("service.token_updates")
+            yield entry.engine
+
+    def _identify(self, access_token: str):
+        with self.lock:
+            if access_token in self.users:
+                self.users.move_to_end(access_token)
+                return self.users[access_token]
+
+        # 처음 보는 토큰만 검증 (네트워크 호출이 있으므로 잠금 밖에서 수행)
+        user_key = self.factory.identify(access_token)
+        with self.lock:
+            self.users[access_token] = user_key
+            while len(self.users) > self.max_sessions * 4:
+                self.users.popitem(last=False)
+        return user_key
+
+    def _get(self, user_key, access_token: str, refresh_token: str = None) -> _Session:
+        with self.lock:
+            if user_key in self.sessions:
+                self.sessions.move_to_end(user_key)
+                return self.sessions[user_key]
+
+        # 세션 생성은 네트워크 호출이 있으므로 잠금 밖에서 수행
+        engine = self.factory.create(access_token, refresh_token)
+        with self.lock:
+            if user_key in self.sessions:
+                # 그사이 같은 사용자의 세션이 먼저 만들어졌으면 그것을 사용
+                return self.sessions[user_key]
+            entry = self.sessions[user_key] = _Session(engine, access_token)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        return entry
+
+    def __len__(self):
+        return len(self.sessions)
+
+
+class SupabaseSessionFactory:
+    """
+    Supabase용 세션 생성
+    refresh token은 클라이언트가 계속 갱신(교체)하므로 서버에서는 갱신하지 않음 (auto_refresh_token=False)
+    """
+
+    def __init__(self, gemini_model, cfg: dict):
+        from supabase import create_client, ClientOptions
+
+        self.url = os.getenv("URL")
+        self.key = os.getenv("API")
+        self.gemini_model = gemini_model
+        self.cfg = cfg
+        self._create_client = lambda: create_client(self.url, self.key, options=ClientOptions(auto_refresh_token=False, persist_session=False))
+        self.auth_client = self._create_client()  # 토큰 검증용
+
+    def identify(self, access_token: str):
+        """토큰을 검증하고 사용자 id를 반환 (유효하지 않으면 예외)"""
+        return self.auth_client.auth.get_user(access_token).user.id
+
+    def create(self, access_token: str, refresh_token: str) -> CommandEngine:
+        client = self._create_client()
+        client.auth.set_session(access_token, refresh_token)
+        user = client.auth.get_user(access_token).user
+        employee_id = user.email.split('@')[0].upper()
+        is_admin = client.rpc('get_my_role').execute().data == '관리자'
+        return CommandEngine(client, self.gemini_model, employee_id, is_admin, build_system_prompt(self.cfg, is_admin))
+
+    def update(self, engine: CommandEngine, access_token: str, refresh_token: str):
+        engine.supabase.auth.set_session(access_token, refresh_token)
+
+
+class LocalSessionFactory:
+    """로컬 백엔드용: access token을 사번으로 취급"""
+
+    def __init__(self, backend, gemini_model, cfg: dict):
+        self.backend = backend
+        self.gemini_model = gemini_model
+        self.cfg = cfg
+
+    def identify(self, access_token: str):
+        return access_token.upper()
+
+    def create(self, access_token: str, refresh_token: str) -> CommandEngine:
+        client = self.backend.as_user(access_token.upper())
+        is_admin = client.rpc('get_my_role').execute().data == '관리자'
+        return CommandEngine(client, self.gemini_model, access_token.upper(), is_admin, build_system_prompt(self.cfg, is_admin))
+
+    def update(self, engine: CommandEngine, access_token: str, refresh_token: str):
+        pass
+
+
+class EngineService:
+    def __init__(self, session_pool: SessionPool, workers: int = 4, queue_size: int = 64, stock_monitor=None):
+        self.session_pool = session_pool
+        self.stock_monitor = stock_monitor
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="engine")
+        self.started_at = time.time()
+        self.stats = {"accepted": 0, "rejected": 0, "completed": 0, "failed": 0, "busy_seconds": 0.0}
+        self.server = None
+        self.worker_tasks = []
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        # 이벤트 루프는 작업에 약한 참조만 두므로, 작업자가 도중에 사라지지 않도록 참조를 보관
+        self.worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self.server = await asyncio.start_server(self._handle_connection, host, port)
+        return self.server
+
+    async def serve_forever(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    def health(self) -> dict:
+        uptime = time.time() - self.started_at
+        return {
+            "status": "ok",
+            "queue": self.queue.qsize(),
+            "sessions": len(self.session_pool),
+            "workers": self.workers,
+            "uptime_s": round(uptime, 1),
+            "commands_per_s": round(self.stats["completed"] / uptime, 3) if uptime > 0 else 0.0,
+            **self.stats,
+            "metrics": metrics.snapshot(),
+        }
+
+    # --- 작업 처리 ---
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            started = time.perf_counter()
+            try:
+                await loop.run_in_executor(self.executor, self._run_job, job, loop)
+            finally:
+                self.stats["busy_seconds"] += time.perf_counter() - started
+                self.queue.task_done()
+
+    def _run_job(self, job, loop):
+        """작업자 스레드에서 실행. 엔진 이벤트를 요청별 asyncio 큐로 전달"""
+        access_token, refresh_token, command, tasks, narrate, request_key, events = job
+
+        def emit(event):
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        try:
+            with self.session_pool.session(access_token, refresh_token) as engine:
+                # 재고 부족 상태는 모든 세션이 하나의 모니터를 공유
+                engine.stock_monitor = self.stock_monitor
+                if tasks is None and engine.gemini_model is None:
+                    raise ValueError("Gemini가 설정되지 않아 tasks로만 요청할 수 있습니다.")
+                # 화면 전용 작업은 클라이언트에 넘김
+                handlers = {action: lambda task: emit({"type": "task", "task": task}) for action in UI_ACTIONS}
+                engine.run(command, emit, tasks=tasks, handlers=handlers, narrate=narrate, request_key=request_key)
+            self.stats["completed"] += 1
+        except Exception as e:
+            self.stats["failed"] += 1
+            emit({"type": "error", "text": f"처리 중 오류가 발생했습니다: {e}"})
+        finally:
+            emit({"type": "done"})
+
+    # --- HTTP ---
+    async def _handle_connection(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            if not request_line:
+                return
+            method, path, _ = request_line.split(" ", 2)
+
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            length = int(headers.get("content-length", 0))
+            if length > MAX_BODY_BYTES:
+                await self._send_json(writer, 413, {"error": "요청 본문이 너무 큽니다."})
+                return
+            body = await reader.readexactly(length) if length else b""
+
+            if method == "GET" and path == "/v1/health":
+                await self._send_json(writer, 200, self.health())
+            elif method == "POST" and path == "/v1/commands":
+                await self._handle_command(writer, headers, body)
+            else:
+                await self._send_json(writer, 404, {"error": "not found"})
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            await self._send_json(writer, 400, {"error": f"잘못된 요청입니다: {e}"})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_command(self, writer, headers, body):
+        access_token = headers.get("authorization", "").removeprefix("Bearer ").strip()
+        if not access_token:
+            await self._send_json(writer, 401, {"error": "Authorization 헤더가 필요합니다."})
+            return
+
+        request = json.loads(body or b"{}")
+        if not isinstance(request, dict):
+            raise ValueError("요청 본문은 JSON 객체여야 합니다.")
+        command = str(request.get("command", "")).strip()
+        tasks = request.get("tasks")
+        if tasks is not None and not (isinstance(tasks, list) and all(isinstance(task, dict) for task in tasks)):
+            raise ValueError("tasks는 작업 객체의 목록이어야 합니다.")
+        narrate = bool(request.get("narrate", True))
+        if not command and tasks is None:
+            await self._send_json(writer, 400, {"error": "command 또는 tasks가 필요합니다."})
+            return
+
+        events = asyncio.Queue()
+        try:
+            self.queue.put_nowait((access_token, headers.get("x-refresh-token"), command, tasks, narrate, headers.get("idempotency-key"), events))
+            self.stats["accepted"] += 1
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            await self._send_json(writer, 503, {"error": "요청이 많아 잠시 후 다시 시도해주세요."})
+            return
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/x-ndjson; charset=utf-8\r\n"
+            b"Transfer-Encoding: chunked\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        while True:
+            event = await events.get()
+            line = (json.dumps(event, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+            writer.write(f"{len(line):X}\r\n".encode() + line + b"\r\n")
+            await writer.drain()
+            if event["type"] == "done":
+                break
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _send_json(self, writer, status: int, payload: dict):
+        reasons = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 413: "Payload Too Large", 503: "Service Unavailable"}
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {reasons.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="디저트 재고 명령 처리 서비스")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=4, help="동시에 처리할 명령 수")
+    parser.add_argument("--queue-size", type=int, default=64, help="대기열 최대 길이")
+    parser.add_argument("--local", action="store_true", help="Supabase 대신 인메모리 백엔드 사용")
+    parser.add_argument("--seed", help="--local 사용 시 초기 데이터 JSON 파일")
+    args = parser.parse_args()
+
+    base_path = os.path.dirname(os.path.abspath(__file__))
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(base_path, '.env'))
+    with open(os.path.join(base_path, 'prompts.toml'), "rb") as f:
+        cfg = tomllib.load(f)
+
+    # 모든 세션이 하나의 Gemini 모델을 공유
+    gemini_model = None
+    if os.getenv("GEMINI_API_KEY"):
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        gemini_model = genai.GenerativeModel(model_name='gemini-2.0-flash')
+
+    if args.local:
+        from local_backend import LocalBackend
+        backend = LocalBackend.from_json(args.seed) if args.seed else LocalBackend(LOCAL_SEED)
+        factory = LocalSessionFactory(backend, gemini_model, cfg)
+    else:
+        if gemini_model is None:
+            sys.exit(".env에 GEMINI_API_KEY가 필요합니다.")
+        factory = SupabaseSessionFactory(gemini_model, cfg)
+
+    stock_monitor = load_monitor(os.path.join(base_path, 'alerts.toml'), base_path)
+    service = EngineService(SessionPool(factory), workers=args.workers, queue_size=args.queue_size, stock_monitor=stock_monitor)
+    print(f"명령 처리 서비스 시작: http://{args.host}:{args.port} ({'로컬 백엔드' if args.local else 'Supabase'})")
+    try:
+        asyncio.run(service.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+모든 Gemini 호출(명령 파싱, 응답 생성)이 공유하는 요청 스케줄러
+  - 토큰 버킷으로 초당 요청 수 제한 (버스트 허용)
+  - 429/5xx 오류는 지터를 준 지수 백오프로 재시도
+  - 호출마다 마감 시간(deadline)이 있어 무한정 기다리지 않음 (남은 시간을 요청 자체의 timeout으로도 전달)
+  - 같은 프롬프트가 이미 처리 중이면 새로 보내지 않고 그 결과를 함께 받음
+"""
+
+import time
+import random
+import threading
+from concurrent.futures import Future
+from instrumentation import metrics
+
+RATE_PER_SECOND = 4.0
+BURST = 8
+MAX_RETRIES = 4
+BASE_BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 8.0
+DEFAULT_DEADLINE_SECONDS = 30.0
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+RETRYABLE_ERROR_NAMES = ("ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError", "DeadlineExceeded", "GatewayTimeout")
+
+
+class GeminiUnavailableError(Exception):
+    """재시도와 마감 시간 안에 응답을 받지 못함"""
+
+
+def is_retryable(error: Exception) -> bool:
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_STATUS:
+        return True
+    return type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, deadline: float) -> bool:
+        """토큰 하나를 얻을 때까지 대기. 마감 시간 안에 못 얻으면 False"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class GeminiScheduler:
+    def __init__(self, rate: float = RATE_PER_SECOND, burst: int = BURST, max_retries: int = MAX_RETRIES,
+                 deadline: float = DEFAULT_DEADLINE_SECONDS):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.deadline = deadline
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def generate(self, model, prompt: str, deadline: float = None) -> str:
+        """model.generate_content(prompt).text 를 스케줄러를 거쳐 호출"""
+        timeout = deadline or self.deadline
+        key = (id(model), prompt)
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not is_leader:
+            metrics.incr("gemini.coalesced")
+            try:
+                return future.result(timeout=timeout)
+            except TimeoutError:
+                raise GeminiUnavailableError("Gemini 응답 대기 시간을 초과했습니다.")
+
+        try:
+            text = self._call_with_retry(model, prompt, time.monotonic() + timeout)
+            future.set_result(text)
+            return text
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _call_with_retry(self, model, prompt: str, deadline: float) -> str:
+        attempt = 0
+        while True:
+            wait_started = time.perf_counter()
+            if not self.bucket.acquire(deadline):
+                metrics.incr("gemini.rate_limited")
+                raise GeminiUnavailableError("요청이 많아 잠시 후 다시 시도해주세요.")
+            metrics.observe("gemini.queue_wait", time.perf_counter() - wait_started)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise GeminiUnavailableError("Gemini 응답 대기 시간을 초과했습니다.")
+            started = time.perf_counter()
+            try:
+                metrics.incr("gemini.calls")
+                # 응답이 오지 않는 호출도 마감 시간에 끊기도록 남은 시간을 요청 timeout으로 전달
+                text = model.generate_content(prompt, request_options={"timeout": remaining}).text
+                metrics.observe("gemini.latency", time.perf_counter() - started)
+                return text
+            except Exception as e:
+                metrics.incr("gemini.errors")
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+
+                # full jitter: 0 ~ min(최대, 기본 * 2^시도) 사이에서 무작위 대기
+                backoff = random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt))
+                if time.monotonic() + backoff > deadline:
+                    raise GeminiUnavailableError(f"Gemini 서버가 바쁩니다. 잠시 후 다시 시도해주세요. ({e})")
+                metrics.incr("gemini.retries")
+                time.sleep(backoff)
+                attempt += 1
+
+
+# 프로세스 전체가 공유하는 스케줄러
+scheduler = GeminiScheduler()
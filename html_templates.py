@@ -1,3 +1,6 @@
+from datetime import timedelta
+
+
 class HTMLTemplates:
     @staticmethod
     def get_table_header_style():
@@ -92,6 +95,130 @@ class HTMLTemplates:
         log_html += "</tbody></table></div>"
         return log_html
 
+    @staticmethod
+    def generate_restock_preview_html(diff):
+        """일괄 입고 미리보기(dry-run)를 위한 HTML 테이블을 생성"""
+        if not diff:
+            return HTMLTemplates.generate_system_message("입고할 항목이 없습니다.")
+
+        th_attributes = HTMLTemplates.get_table_header_style()
+        td_attributes = HTMLTemplates.get_table_cell_style()
+        table_attributes = HTMLTemplates.get_table_attributes()
+
+        preview_html = (
+            "<div align='left'><p style='color: #555; margin-left: 10px;'>"
+            f"-> <b>일괄 입고 미리보기 ({len(diff)}건):</b></p>"
+        )
+        preview_html += f"<table {table_attributes}>"
+        preview_html += (
+            f"<thead><tr>"
+            f"<th {th_attributes}>층</th>"
+            f"<th {th_attributes}>제품</th>"
+            f"<th {th_attributes}>현재</th>"
+            f"<th {th_attributes}>입고</th>"
+            f"<th {th_attributes}>변경 후</th>"
+            f"</tr></thead><tbody>"
+        )
+
+        for row in diff:
+            product_name = row.get('product_name', '')
+            if row.get('is_new'):
+                product_name += " <span style='color: #409eff;'>(신규)</span>"
+            preview_html += (
+                f"<tr>"
+                f"<td {td_attributes}>{row.get('floor', '')}층</td>"
+                f"<td {td_attributes}>{product_name}</td>"
+                f"<td {td_attributes}>{row.get('before', '')}</td>"
+                f"<td {td_attributes}>+{row.get('change', '')}</td>"
+                f"<td {td_attributes}>{row.get('after', '')}</td>"
+                f"</tr>"
+            )
+
+        preview_html += "</tbody></table></div>"
+        return preview_html
+
+    @staticmethod
+    def generate_settlement_summary_html(report, top_n=10):
+        """정산 결과 요약(합계, 층별 합계, 수량 상위 직원)을 위한 HTML을 생성"""
+        total = report["total"]
+        period = f"{report['start']:%Y-%m-%d} ~ {report['end'] - timedelta(days=1):%Y-%m-%d}"
+        if not total["count"]:
+            return HTMLTemplates.generate_system_message(f"{period} 기간의 구매 기록이 없습니다.")
+
+        th_attributes = HTMLTemplates.get_table_header_style()
+        td_attributes = HTMLTemplates.get_table_cell_style()
+        table_attributes = HTMLTemplates.get_table_attributes()
+
+        floors = sorted(report["by_floor"].items(), key=lambda item: str(item[0]))
+        floor_text = ", ".join(f"{floor}{'층' if isinstance(floor, int) else ''} {entry['quantity']}개" for floor, entry in floors)
+        employees = sorted(report["by_employee"].items(), key=lambda item: -item[1]["quantity"])
+
+        summary_html = (
+            "<div align='left'><p style='color: #555; margin-left: 10px;'>"
+            f"-> <b>정산 요약 ({period}):</b> 직원 {len(employees)}명, {total['count']}건, 총 {total['quantity']}개"
+            f"<br>층별: {floor_text}</p>"
+        )
+        summary_html += f"<table {table_attributes}>"
+        summary_html += (
+            f"<thead><tr>"
+            f"<th {th_attributes}>사번</th>"
+            f"<th {th_attributes}>이름</th>"
+            f"<th {th_attributes}>건수</th>"
+            f"<th {th_attributes}>수량</th>"
+            f"</tr></thead><tbody>"
+        )
+
+        for employee_id, entry in employees[:top_n]:
+            summary_html += (
+                f"<tr>"
+                f"<td {td_attributes}>{employee_id}</td>"
+                f"<td {td_attributes}>{report['names'].get(employee_id, '')}</td>"
+                f"<td {td_attributes}>{entry['count']}</td>"
+                f"<td {td_attributes}>{entry['quantity']}</td>"
+                f"</tr>"
+            )
+
+        summary_html += "</tbody></table>"
+        if len(employees) > top_n:
+            summary_html += f"<p style='color: #555; margin-left: 10px;'>외 {len(employees) - top_n}명은 파일에서 확인하세요.</p>"
+        summary_html += "</div>"
+        return summary_html
+
+    @staticmethod
+    def generate_row_errors_html(errors, title="처리하지 못한 행"):
+        """행 단위 오류 목록을 위한 HTML 테이블을 생성"""
+        if not errors:
+            return ""
+
+        th_attributes = HTMLTemplates.get_table_header_style()
+        td_attributes = HTMLTemplates.get_table_cell_style()
+        table_attributes = HTMLTemplates.get_table_attributes()
+
+        error_html = (
+            "<div align='left'><p style='color: red; margin-left: 10px;'>"
+            f"-> <b>{title} ({len(errors)}건):</b></p>"
+        )
+        error_html += f"<table {table_attributes}>"
+        error_html += (
+            f"<thead><tr>"
+            f"<th {th_attributes}>행</th>"
+            f"<th {th_attributes}>항목</th>"
+            f"<th {th_attributes}>사유</th>"
+            f"</tr></thead><tbody>"
+        )
+
+        for error in errors:
+            error_html += (
+                f"<tr>"
+                f"<td {td_attributes}>{error.get('row', '')}</td>"
+                f"<td {td_attributes}>{error.get('product_name', error.get('employee_id', ''))}</td>"
+                f"<td {td_attributes}>{error.get('reason', '')}</td>"
+                f"</tr>"
+            )
+
+        error_html += "</tbody></table></div>"
+        return error_html
+
     @staticmethod
     def generate_user_message(user_name, command):
         """사용자 메시지 버블을 위한 HTML을 생성"""
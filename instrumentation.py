@@ -0,0 +1,60 @@
+"""
+간단한 프로세스 내 계측 (카운터와 소요 시간)
+  metrics.incr("session.refresh_failed")
+  with metrics.timer("session.refresh"): ...
+  metrics.snapshot() -> {"counters": {...}, "timings": {이름: {"count", "avg_ms", "p50_ms", "p95_ms", "max_ms"}}}
+"""
+
+import time
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+TIMING_WINDOW = 1000  # 이름별로 최근 N개의 소요 시간만 보관
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._timings = defaultdict(lambda: deque(maxlen=TIMING_WINDOW))
+        self._timing_counts = defaultdict(int)
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            self._timings[name].append(seconds)
+            self._timing_counts[name] += 1
+
+    @contextmanager
+    def timer(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            timings = {name: sorted(values) for name, values in self._timings.items()}
+            counts = dict(self._timing_counts)
+
+        summary = {}
+        for name, values in timings.items():
+            if not values:
+                continue
+            summary[name] = {
+                "count": counts[name],
+                "avg_ms": round(sum(values) / len(values) * 1000, 1),
+                "p50_ms": round(values[len(values) // 2] * 1000, 1),
+                "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1),
+            }
+        return {"counters": counters, "timings": summary}
+
+
+metrics = Metrics()
@@ -0,0 +1,132 @@
+"""
+마지막으로 받은 재고를 로컬 SQLite 파일에 보관
+프로그램 시작/로그아웃 직후에도 네트워크 없이 재고 표를 바로 그릴 수 있고,
+로그인 후에는 updated_at 이후에 바뀐 행만 받아 맞춥니다 (query.md의 updated_at 컬럼 필요).
+updated_at 컬럼이 없으면 전체를 받아 덮어씁니다.
+
+층을 주면 그 층만 맞추므로 (층마다 커서를 따로 둠) 화면에 보이는 탭만 먼저 받을 수 있습니다.
+
+updated_at은 트랜잭션 시작 시각(now())이라 늦게 커밋된 행이 커서보다 이전 시각을 가질 수 있으므로,
+변경분은 커서에서 SYNC_OVERLAP만큼 앞당겨 받고 덮어써서 맞춥니다.
+"""
+
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from instrumentation import metrics
+
+# 가장 긴 재고 쓰기 트랜잭션보다 넉넉하게
+SYNC_OVERLAP = timedelta(minutes=5)
+
+
+class InventorySnapshot:
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS inventory (
+                product_name TEXT NOT NULL,
+                floor INTEGER NOT NULL,
+                quantity INTEGER NOT NULL,
+                PRIMARY KEY (product_name, floor)
+            );
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+
+    def _get_meta(self, key: str):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value):
+        if value is None:
+            self.conn.execute("DELETE FROM meta WHERE key = ?", (key,))
+        else:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    @property
+    def synced_at(self):
+        """마지막 동기화 시각 (datetime) 또는 None"""
+        value = self._get_meta("synced_at")
+        return datetime.fromtimestamp(float(value)) if value else None
+
+    def load(self, floor=None) -> list:
+        """스냅샷의 재고 행 (floor를 주면 그 층만)"""
+        if floor is None:
+            rows = self.conn.execute("SELECT product_name, floor, quantity FROM inventory ORDER BY floor, product_name").fetchall()
+        else:
+            rows = self.conn.execute("SELECT product_name, floor, quantity FROM inventory WHERE floor = ? ORDER BY product_name", (floor,)).fetchall()
+        return [{"product_name": name, "floor": floor, "quantity": quantity} for name, floor, quantity in rows]
+
+    def sync(self, supabase, floor=None) -> list:
+        """
+        서버와 맞춘 뒤 재고를 반환. 변경분 조회가 안 되면 전체 조회로 대체
+        floor를 주면 그 층만 맞추고 그 층의 행만 반환
+        """
+        started = time.perf_counter()
+        cursor_key = "cursor" if floor is None else f"cursor:{floor}"
+        cursor = self._get_meta(cursor_key)
+        synced = False
+        if cursor:
+            try:
+                self._sync_delta(supabase, cursor_key, cursor, floor)
+                synced = True
+            except Exception:
+                metrics.incr("snapshot.delta_failed")
+        if not synced:
+            self._sync_full(supabase, cursor_key, floor)
+
+        self._set_meta("synced_at", time.time())
+        self.conn.commit()
+        metrics.observe("snapshot.sync", time.perf_counter() - started)
+        return self.load(floor)
+
+    def _query(self, supabase, columns: str, floor):
+        query = supabase.table("inventory").select(columns)
+        return query if floor is None else query.eq("floor", floor)
+
+    def _local_keys(self, floor) -> list:
+        if floor is None:
+            return self.conn.execute("SELECT product_name, floor FROM inventory").fetchall()
+        return self.conn.execute("SELECT product_name, floor FROM inventory WHERE floor = ?", (floor,)).fetchall()
+
+    def _sync_delta(self, supabase, cursor_key: str, cursor: str, floor):
+        # 겹치는 구간은 다시 받아도 덮어쓰기라 결과가 같음
+        since = (datetime.fromisoformat(cursor) - SYNC_OVERLAP).isoformat()
+        changed = self._query(supabase, "product_name, floor, quantity, updated_at", floor).gte("updated_at", since).execute().data
+        # 삭제된 행은 updated_at으로 알 수 없으므로 키만 받아 비교
+        keys = self._query(supabase, "product_name, floor", floor).execute().data
+
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO inventory (product_name, floor, quantity) VALUES (?, ?, ?)",
+            [(r["product_name"], r["floor"], r["quantity"]) for r in changed],
+        )
+        live = {(k["product_name"], k["floor"]) for k in keys}
+        stale = [key for key in self._local_keys(floor) if key not in live]
+        self.conn.executemany("DELETE FROM inventory WHERE product_name = ? AND floor = ?", stale)
+
+        if changed:
+            latest = max(changed, key=lambda r: datetime.fromisoformat(r["updated_at"]))["updated_at"]
+            if datetime.fromisoformat(latest) > datetime.fromisoformat(cursor):
+                self._set_meta(cursor_key, latest)
+        metrics.incr("snapshot.delta_rows", len(changed))
+
+    def _sync_full(self, supabase, cursor_key: str, floor):
+        try:
+            rows = self._query(supabase, "product_name, floor, quantity, updated_at", floor).execute().data
+        except Exception:
+            # updated_at 컬럼이 없는 DB
+            rows = self._query(supabase, "product_name, floor, quantity", floor).execute().data
+
+        if floor is None:
+            self.conn.execute("DELETE FROM inventory")
+        else:
+            self.conn.execute("DELETE FROM inventory WHERE floor = ?", (floor,))
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO inventory (product_name, floor, quantity) VALUES (?, ?, ?)",
+            [(r["product_name"], r["floor"], r["quantity"]) for r in rows],
+        )
+        cursors = [r["updated_at"] for r in rows if r.get("updated_at")]
+        self._set_meta(cursor_key, max(cursors, key=datetime.fromisoformat) if cursors else None)
+        metrics.incr("snapshot.full_rows", len(rows))
+
+    def close(self):
+        self.conn.close()
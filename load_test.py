@@ -0,0 +1,200 @@
+"""
+재고 경합 부하 테스트
+인메모리 백엔드(local_backend.py)에 여러 사용자가 동시에 명령을 보내고 처리량/지연 시간을 측정한 뒤
+다음 불변 조건을 검사합니다. 하나라도 어기면 종료 코드 1로 끝나므로 회귀 검사에 사용할 수 있습니다.
+  - 재고가 음수가 되지 않음
+  - 갱신 유실 없음: 품목별 최종 재고 = 초기 재고 + 성공한 입고 합계 - 성공한 차감 합계
+  - purchase_logs의 건수/수량 합계 = 성공한 차감의 건수/수량 합계
+
+명령은 GUI(process_input)와 공유 서비스가 사용하는 CommandEngine.run으로 실행되며,
+Gemini 대신 작업 목록(tasks)을 직접 넘깁니다.
+--drop-rate를 주면 재고 변경 RPC의 응답 일부를 잃어버려, 같은 멱등 키로 재시도해도 두 번 반영되지 않는지 확인합니다.
+요청 키는 사용자끼리 일부러 겹치게("load-순번") 만들어, 다른 사용자의 저장된 결과를 받는 일이 없는지도 확인합니다.
+--no-rpc는 apply_stock_change RPC가 없는 DB처럼 compare-and-set 경로만 사용합니다.
+
+실행: python load_test.py [--users 50] [--commands 40] [--stock 1000] [--latency-ms 2] [--drop-rate 0.05] [--seed seed.json]
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from local_backend import LocalBackend
+from command_engine import CommandEngine
+from instrumentation import metrics
+from engine_service import LOCAL_SEED
+
+MUTATION_ACTIONS = ["decrement", "increment"]
+
+
+class RecordingEngine(CommandEngine):
+    """실행된 작업의 결과를 기록해 두는 CommandEngine (불변 조건 계산용)"""
+
+    def __init__(self, *args, results: list, results_lock, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.results = results
+        self.results_lock = results_lock
+
+    def _execute(self, task: dict) -> dict:
+        result = super()._execute(task)
+        with self.results_lock:
+            self.results.append(result)
+        return result
+
+
+def build_tables(seed: dict, users: int, admins: int, stock: int = None) -> dict:
+    tables = json.loads(json.dumps(seed))
+    if stock is not None:
+        for row in tables.get("inventory", []):
+            row["quantity"] = stock
+    employees = tables.get("employees", [])
+    for n in range(users):
+        role = "관리자" if n < admins else "사용자"
+        employees.append({"employee_id": f"LOAD{n:04d}", "name": f"부하{n}", "role": role})
+    tables["employees"] = employees
+    tables.setdefault("purchase_logs", [])
+    return tables
+
+
+def random_task(rng: random.Random, items: list, hot_item: dict, is_admin: bool, hot_ratio: float) -> dict:
+    """차감 위주(대부분 같은 품목)의 명령을 무작위로 생성"""
+    item = hot_item if rng.random() < hot_ratio else rng.choice(items)
+    payload = {"name": item["product_name"], "floor": item["floor"]}
+    roll = rng.random()
+    if is_admin and roll < 0.15:
+        return {"action": "increment", "payload": {**payload, "quantity": rng.randint(1, 5)}}
+    if roll < 0.75:
+        return {"action": "decrement", "payload": {**payload, "quantity": rng.randint(1, 3)}}
+    if is_admin and roll < 0.9:
+        return {"action": "query_all", "payload": {}}
+    return {"action": "query_one", "payload": payload}
+
+
+def percentile(values: list, ratio: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+def run_load(backend: LocalBackend, users: int, commands: int, admins: int, hot_ratio: float, seed: int, use_rpc: bool = True):
+    items = [dict(row) for row in backend.tables["inventory"]]
+    hot_item = items[0]
+    results, results_lock = [], threading.Lock()
+    latencies, latencies_lock = [], threading.Lock()
+    errors = []
+
+    def user_session(n: int):
+        employee_id = f"LOAD{n:04d}"
+        is_admin = n < admins
+        engine = RecordingEngine(backend.as_user(employee_id), None, employee_id, is_admin, "",
+                                 results=results, results_lock=results_lock)
+        engine.use_stock_rpc = use_rpc
+        rng = random.Random(seed * 100003 + n)
+        for i in range(commands):
+            task = random_task(rng, items, hot_item, is_admin, hot_ratio)
+            events = []
+            started = time.perf_counter()
+            try:
+                engine.run(f"부하 테스트 {employee_id} #{i}", events.append, tasks=[task], narrate=False, request_key=f"load-{i}")
+            except Exception as e:
+                errors.append(f"{employee_id}: {e}")
+            with latencies_lock:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        list(executor.map(user_session, range(users)))
+    elapsed = time.perf_counter() - started
+    return results, latencies, errors, elapsed
+
+
+def check_invariants(initial: list, final: list, logs: list, results: list) -> list:
+    """어긴 불변 조건을 설명하는 문자열 목록을 반환 (비어 있으면 통과)"""
+    violations = []
+    for row in final:
+        if row["quantity"] < 0:
+            violations.append(f"음수 재고: {row['floor']}층 {row['product_name']} = {row['quantity']}")
+
+    expected = {(r["product_name"], r["floor"]): r["quantity"] for r in initial}
+    decremented = {"count": 0, "quantity": 0}
+    for result in results:
+        if result.get("status") != "success" or result.get("action") not in MUTATION_ACTIONS:
+            continue
+        key = (result["product_name"], result["floor"])
+        if result["action"] == "increment":
+            expected[key] = expected.get(key, 0) + result["quantity"]
+        else:
+            expected[key] = expected.get(key, 0) - result["quantity"]
+            decremented["count"] += 1
+            decremented["quantity"] += result["quantity"]
+
+    actual = {(r["product_name"], r["floor"]): r["quantity"] for r in final}
+    for key, quantity in sorted(expected.items()):
+        if actual.get(key) != quantity:
+            violations.append(f"갱신 유실: {key[1]}층 {key[0]} 예상 {quantity}, 실제 {actual.get(key)}")
+
+    log_quantity = sum(log["quantity"] for log in logs)
+    if len(logs) != decremented["count"] or log_quantity != decremented["quantity"]:
+        violations.append(
+            f"구매 로그 불일치: 로그 {len(logs)}건/{log_quantity}개, 성공한 차감 {decremented['count']}건/{decremented['quantity']}개"
+        )
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="재고 경합 부하 테스트")
+    parser.add_argument("--users", type=int, default=50, help="동시 사용자 수")
+    parser.add_argument("--commands", type=int, default=40, help="사용자별 명령 수")
+    parser.add_argument("--admins", type=int, default=2, help="입고/전체 조회도 하는 관리자 수")
+    parser.add_argument("--hot-ratio", type=float, default=0.8, help="같은 품목에 몰리는 명령 비율")
+    parser.add_argument("--stock", type=int, help="모든 품목의 초기 재고 (생략하면 초기 데이터 그대로)")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="DB 문장당 흉내 낼 왕복 지연")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="처리 후 응답을 잃어버릴 RPC 비율")
+    parser.add_argument("--no-rpc", action="store_true", help="apply_stock_change RPC 없이 compare-and-set으로만 갱신")
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--seed", help="초기 데이터 JSON 파일 (engine_service.py --seed와 같은 형식)")
+    args = parser.parse_args()
+
+    seed = LOCAL_SEED
+    if args.seed:
+        with open(args.seed, encoding="utf-8") as f:
+            seed = json.load(f)
+    backend = LocalBackend(build_tables(seed, args.users, args.admins, args.stock), latency=args.latency_ms / 1000, rpc_drop_rate=args.drop_rate)
+    initial = [dict(row) for row in backend.tables["inventory"]]
+
+    results, latencies, errors, elapsed = run_load(backend, args.users, args.commands, args.admins, args.hot_ratio, args.random_seed, not args.no_rpc)
+    violations = check_invariants(initial, backend.tables["inventory"], backend.tables["purchase_logs"], results)
+
+    total = len(latencies)
+    succeeded = sum(1 for r in results if r.get("status") == "success")
+    counters = metrics.snapshot()["counters"]
+    print(f"사용자 {args.users}명 x 명령 {args.commands}개 = {total}건, {elapsed:.2f}초 ({total / elapsed:.1f}건/초)")
+    print(f"지연 시간 p50 {percentile(latencies, 0.5) * 1000:.1f}ms, p95 {percentile(latencies, 0.95) * 1000:.1f}ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f}ms, 최대 {max(latencies, default=0) * 1000:.1f}ms")
+    reasons = {}
+    for result in results:
+        if result.get("status") != "success":
+            reasons[result.get("reason", "")] = reasons.get(result.get("reason", ""), 0) + 1
+    print(f"작업 {len(results)}건 중 성공 {succeeded}건, DB 문장 {backend.stats['statements']}개, "
+          f"동시 변경 재시도 {counters.get('engine.update_conflicts', 0)}회")
+    print(f"잃어버린 응답 {backend.stats['dropped_responses']}건, 같은 키로 재전송 {counters.get('engine.write_retries', 0)}회, "
+          f"중복 요청 무시 {counters.get('engine.idempotent_replays', 0)}회")
+    for reason, count in sorted(reasons.items(), key=lambda item: -item[1]):
+        print(f"  실패 {count}건: {reason}")
+    for error in errors[:10]:
+        print(f"  예외: {error}")
+
+    if violations or errors:
+        print("불변 조건 위반:")
+        for violation in violations:
+            print(f"  - {violation}")
+        sys.exit(1)
+    print("불변 조건 통과")
+
+
+if __name__ == "__main__":
+    main()
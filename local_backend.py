@@ -0,0 +1,447 @@
+"""
+테스트/오프라인용 인메모리 백엔드
+supabase-py 클라이언트 중 이 프로젝트가 사용하는 부분(table 쿼리, rpc, auth.set_session)만 흉내 냅니다.
+각 execute()는 하나의 잠금 안에서 실행되므로 SQL 문 하나가 원자적인 실제 DB와 같은 동작을 합니다.
+latency를 주면 문장마다 잠금 밖에서 그만큼 대기하여 네트워크 왕복을 흉내 냅니다 (동시성 부하 테스트용).
+rpc_drop_rate를 주면 그 확률로 RPC를 처리한 뒤 응답만 잃어버려(TimeoutError) 재시도 상황을 흉내 냅니다.
+"""
+
+import copy
+import json
+import time
+import random
+import threading
+from datetime import datetime, timezone, timedelta
+
+KST = timezone(timedelta(hours=9))
+# query.md의 유니크 인덱스와 같은 제약 (값이 NULL인 열이 있으면 검사하지 않음)
+UNIQUE_KEYS = {"inventory": ("product_name", "floor")}
+
+
+class LocalBackendError(Exception):
+    pass
+
+
+class LocalResponse:
+    """postgrest APIResponse 대용. `data, count = response` 형태의 언패킹도 지원"""
+
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+    def __iter__(self):
+        yield ("data", self.data)
+        yield ("count", self.count)
+
+
+COMPARISONS = {
+    "eq": lambda v, value: v == value, "neq": lambda v, value: v != value,
+    "gt": lambda v, value: v > value, "gte": lambda v, value: v >= value,
+    "lt": lambda v, value: v < value, "lte": lambda v, value: v <= value,
+}
+
+
+def _split_logic(text: str) -> list:
+    """괄호와 큰따옴표 밖의 쉼표로 나눔"""
+    parts, depth, quoted, current = [], 0, False, ""
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            parts.append(current)
+            current = ""
+            continue
+        current += ch
+    parts.append(current)
+    return parts
+
+
+def _parse_logic(text: str, combine):
+    """PostgREST 논리 필터 문자열을 행 단위 조건 함수로 변환"""
+    conditions = []
+    for part in _split_logic(text):
+        part = part.strip()
+        if part.startswith(("and(", "or(")) and part.endswith(")"):
+            name, _, inner = part.partition("(")
+            conditions.append(_parse_logic(inner[:-1], all if name == "and" else any))
+            continue
+        column, op, value = part.split(".", 2)
+        if op not in COMPARISONS:
+            raise LocalBackendError(f"지원하지 않는 필터입니다: {part}")
+        value = value[1:-1] if value.startswith('"') and value.endswith('"') else value
+        conditions.append(lambda row, column=column, op=op, value=value: _compare(row.get(column), op, value))
+    return lambda row: combine(condition(row) for condition in conditions)
+
+
+def _compare(v, op: str, value: str) -> bool:
+    if v is None:
+        return False
+    # 문자열로 받은 값을 열의 값과 같은 형식으로 맞춤
+    if isinstance(v, bool):
+        value = value == "true"
+    elif isinstance(v, (int, float)):
+        value = type(v)(value)
+    return COMPARISONS[op](v, value)
+
+
+class LocalQuery:
+    def __init__(self, backend, table_name: str):
+        self._backend = backend
+        self._table_name = table_name
+        self._op = "select"
+        self._columns = "*"
+        self._values = None
+        self._on_conflict = None
+        self._filters = []
+        self._orders = []
+        self._limit = None
+        self._single = False
+        self._count = None
+
+    # --- 작업 종류 ---
+    def select(self, columns: str = "*", count=None):
+        self._op, self._columns, self._count = "select", columns, count
+        return self
+
+    def insert(self, values):
+        self._op, self._values = "insert", values
+        return self
+
+    def update(self, values: dict):
+        self._op, self._values = "update", values
+        return self
+
+    def upsert(self, values, on_conflict: str = None):
+        self._op, self._values, self._on_conflict = "upsert", values, on_conflict
+        return self
+
+    def delete(self):
+        self._op = "delete"
+        return self
+
+    # --- 필터 ---
+    def _filter(self, column, predicate):
+        self._filters.append((column, predicate))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, lambda v: v == value)
+
+    def neq(self, column, value):
+        return self._filter(column, lambda v: v != value)
+
+    def gt(self, column, value):
+        return self._filter(column, lambda v: v is not None and v > value)
+
+    def gte(self, column, value):
+        return self._filter(column, lambda v: v is not None and v >= value)
+
+    def lt(self, column, value):
+        return self._filter(column, lambda v: v is not None and v < value)
+
+    def lte(self, column, value):
+        return self._filter(column, lambda v: v is not None and v <= value)
+
+    def or_(self, filters: str):
+        """PostgREST or 필터. "열.연산자.값"과 and(...)/or(...) 묶음만 지원"""
+        self._filters.append((None, _parse_logic(filters, any)))
+        return self
+
+    def in_(self, column, values):
+        values = list(values)
+        return self._filter(column, lambda v: v in values)
+
+    def order(self, column, desc: bool = False):
+        self._orders.append((column, desc))
+        return self
+
+    def limit(self, size: int):
+        self._limit = size
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    # --- 실행 ---
+    def _matches(self, row):
+        return all(predicate(row) if column is None else predicate(row.get(column)) for column, predicate in self._filters)
+
+    def _project(self, row):
+        if self._columns.strip() == "*":
+            return dict(row)
+        return {c.strip(): row.get(c.strip()) for c in self._columns.split(",")}
+
+    def execute(self):
+        if self._backend.latency:
+            time.sleep(self._backend.latency)
+        with self._backend.lock:
+            self._backend.stats["statements"] += 1
+            rows = self._backend.tables.setdefault(self._table_name, [])
+
+            if self._op == "select":
+                result = [r for r in rows if self._matches(r)]
+                for column, desc in reversed(self._orders):
+                    result.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+                if self._limit is not None:
+                    result = result[:self._limit]
+                result = [self._project(r) for r in result]
+                count = len(result) if self._count else None
+                if self._single:
+                    if len(result) != 1:
+                        raise LocalBackendError(f"JSON object requested, multiple (or no) rows returned ({len(result)})")
+                    return LocalResponse(copy.deepcopy(result[0]), count)
+                return LocalResponse(copy.deepcopy(result), count)
+
+            if self._op == "insert":
+                records = self._values if isinstance(self._values, list) else [self._values]
+                # 여러 행 추가도 한 문장이므로 하나라도 실패하면 모두 취소
+                saved_rows, saved_sequence = list(rows), self._backend.sequences.get(self._table_name, 0)
+                try:
+                    inserted = [self._backend._insert_row(self._table_name, record) for record in records]
+                except LocalBackendError:
+                    self._backend.tables[self._table_name] = saved_rows
+                    self._backend.sequences[self._table_name] = saved_sequence
+                    raise
+                return LocalResponse(copy.deepcopy(inserted))
+
+            if self._op == "update":
+                updated = []
+                for row in rows:
+                    if self._matches(row):
+                        row.update(copy.deepcopy(self._values))
+                        self._backend._touch(self._table_name, row)
+                        updated.append(row)
+                return LocalResponse(copy.deepcopy(updated))
+
+            if self._op == "upsert":
+                records = self._values if isinstance(self._values, list) else [self._values]
+                keys = [c.strip() for c in (self._on_conflict or "id").split(",")]
+                result = []
+                for record in records:
+                    existing = next((r for r in rows if all(r.get(k) == record.get(k) for k in keys)), None)
+                    if existing is not None:
+                        existing.update(copy.deepcopy(record))
+                        self._backend._touch(self._table_name, existing)
+                        result.append(existing)
+                    else:
+                        result.append(self._backend._insert_row(self._table_name, record))
+                return LocalResponse(copy.deepcopy(result))
+
+            if self._op == "delete":
+                deleted = [r for r in rows if self._matches(r)]
+                self._backend.tables[self._table_name] = [r for r in rows if not self._matches(r)]
+                return LocalResponse(copy.deepcopy(deleted))
+
+            raise LocalBackendError(f"지원하지 않는 작업입니다: {self._op}")
+
+
+class LocalRpc:
+    def __init__(self, backend, name: str, params: dict):
+        self._backend = backend
+        self._name = name
+        self._params = params or {}
+
+    def execute(self):
+        function = self._backend.rpcs.get(self._name)
+        if function is None:
+            raise LocalBackendError(f"알 수 없는 RPC입니다: {self._name}")
+        if self._backend.latency:
+            time.sleep(self._backend.latency)
+        with self._backend.lock:
+            self._backend.stats["statements"] += 1
+            result = copy.deepcopy(function(self._backend, self._params))
+        if self._backend.rpc_drop_rate and random.random() < self._backend.rpc_drop_rate:
+            self._backend.stats["dropped_responses"] += 1
+            raise TimeoutError(f"{self._name} 응답 시간 초과 (흉내)")
+        return LocalResponse(result)
+
+
+class LocalAuth:
+    def set_session(self, access_token, refresh_token):
+        return None
+
+
+class LocalBackend:
+    """
+    인메모리 테이블 저장소
+    as_user()로 같은 저장소를 공유하면서 사용자(사번)만 다른 클라이언트를 만들 수 있습니다.
+    """
+
+    def __init__(self, tables: dict = None, employee_id: str = None, latency: float = 0.0, rpc_drop_rate: float = 0.0):
+        self.lock = threading.RLock()
+        self.latency = latency
+        self.rpc_drop_rate = rpc_drop_rate
+        self.tables = copy.deepcopy(tables) if tables else {}
+        self.sequences = {}
+        self.stats = {"statements": 0, "dropped_responses": 0}
+        self.employee_id = employee_id
+        self.auth = LocalAuth()
+        self.rpcs = {
+            "get_my_role": _rpc_get_my_role,
+            "get_purchase_logs_kst": _rpc_get_purchase_logs_kst,
+            "get_inventory_floors": _rpc_get_inventory_floors,
+            "apply_stock_change": _rpc_apply_stock_change,
+            "apply_restock_batch": _rpc_apply_restock_batch,
+        }
+        for table_name, rows in self.tables.items():
+            self.sequences[table_name] = max((r.get("id", 0) for r in rows), default=0)
+
+    @classmethod
+    def from_json(cls, path: str):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def as_user(self, employee_id: str):
+        view = copy.copy(self)
+        view.employee_id = employee_id
+        return view
+
+    def table(self, name: str) -> LocalQuery:
+        return LocalQuery(self, name)
+
+    def rpc(self, name: str, params: dict = None) -> LocalRpc:
+        return LocalRpc(self, name, params)
+
+    def _insert_row(self, table_name: str, record: dict) -> dict:
+        row = copy.deepcopy(record)
+        keys = UNIQUE_KEYS.get(table_name)
+        if keys and all(row.get(k) is not None for k in keys):
+            for existing in self.tables.get(table_name, []):
+                if all(existing.get(k) == row.get(k) for k in keys):
+                    raise LocalBackendError(f"duplicate key value violates unique constraint ({', '.join(keys)})")
+        if "id" not in row:
+            self.sequences[table_name] = self.sequences.get(table_name, 0) + 1
+            row["id"] = self.sequences[table_name]
+        if table_name == "inventory":
+            self._touch(table_name, row)
+        if table_name == "purchase_logs":
+            row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+        self.tables.setdefault(table_name, []).append(row)
+        return row
+
+    def _touch(self, table_name: str, row: dict):
+        """query.md의 touch_updated_at 트리거와 같은 동작"""
+        if table_name == "inventory":
+            row["updated_at"] = datetime.now(timezone.utc).isoformat()
+
+
+def _rpc_get_my_role(backend, params):
+    for employee in backend.tables.get("employees", []):
+        if employee.get("employee_id") == backend.employee_id:
+            return employee.get("role", "")
+    return None
+
+
+def _find_idempotency_key(backend, key: str, fingerprint: str):
+    """이 사용자가 key로 저장한 결과. 다른 작업에 쓰였던 키면 query.md와 같이 오류"""
+    keys = backend.tables.setdefault("idempotency_keys", [])
+    stored = next((k for k in keys if k["employee_id"] == backend.employee_id and k["key"] == key), None)
+    if stored is not None and stored.get("fingerprint") not in (None, fingerprint):
+        raise LocalBackendError(f"idempotency key reused for a different operation: {key}")
+    return stored
+
+
+def _store_idempotency_key(backend, key: str, action: str, fingerprint: str, result: dict):
+    backend.tables.setdefault("idempotency_keys", []).append({
+        "key": key, "employee_id": backend.employee_id, "action": action, "fingerprint": fingerprint,
+        "result": result, "created_at": datetime.now(timezone.utc).isoformat(),
+    })
+
+
+def _rpc_apply_stock_change(backend, params):
+    """
+    query.md의 apply_stock_change와 같은 동작 (잠금 안에서 실행되므로 하나의 트랜잭션과 같음)
+    사번은 인자 대신 이 클라이언트의 사용자(as_user)로 정하고, 멱등 키도 사용자별로 구분함
+    """
+    employee_id = backend.employee_id
+    if employee_id is None:
+        raise LocalBackendError("not authenticated")
+    action = params["p_action"]
+    product_name, floor, quantity = params["p_product_name"], params["p_floor"], params["p_quantity"]
+    fingerprint = "|".join(str(value) for value in (action, product_name, floor, quantity))
+    stored = _find_idempotency_key(backend, params["p_key"], fingerprint)
+    if stored is not None:
+        return {**stored["result"], "replayed": True}
+
+    row = next((r for r in backend.tables.get("inventory", []) if r.get("product_name") == product_name and r.get("floor") == floor), None)
+    if action == "decrement":
+        if row is None:
+            result = {"status": "fail", "reason": "해당 층에 없는 제품"}
+        elif row["quantity"] < quantity:
+            result = {"status": "fail", "reason": f"재고 부족 (현재 {row['quantity']}개)"}
+        else:
+            row["quantity"] -= quantity
+            backend._touch("inventory", row)
+            backend._insert_row("purchase_logs", {
+                "employee_id": employee_id, "item_id": row.get("item_id"),
+                "product_name": product_name, "quantity": quantity,
+            })
+            result = {"status": "success", "new_quantity": row["quantity"]}
+    elif action == "increment":
+        if _rpc_get_my_role(backend, {}) != "관리자":
+            result = {"status": "fail", "reason": "권한 없음"}
+        elif row is None:
+            row = backend._insert_row("inventory", {"product_name": product_name, "floor": floor, "quantity": quantity})
+            row["item_id"] = row["id"]
+            result = {"status": "success", "new_quantity": row["quantity"]}
+        else:
+            row["quantity"] += quantity
+            backend._touch("inventory", row)
+            result = {"status": "success", "new_quantity": row["quantity"]}
+    else:
+        raise LocalBackendError(f"지원하지 않는 작업입니다: {action}")
+
+    _store_idempotency_key(backend, params["p_key"], action, fingerprint, result)
+    return {**result, "replayed": False}
+
+
+def _rpc_apply_restock_batch(backend, params):
+    """query.md의 apply_restock_batch와 같은 동작: 쓰는 시점의 재고에 수량을 더함"""
+    employee_id = backend.employee_id
+    if employee_id is None or _rpc_get_my_role(backend, {}) != "관리자":
+        raise LocalBackendError("permission denied")
+    fingerprint = "restock|" + json.dumps(params["p_rows"], ensure_ascii=False, sort_keys=True)
+    stored = _find_idempotency_key(backend, params["p_key"], fingerprint)
+    if stored is not None:
+        return {**stored["result"], "replayed": True}
+
+    totals = {}
+    for row in params["p_rows"]:
+        if row["quantity"] > 0:
+            key = (row["product_name"], row["floor"])
+            totals[key] = totals.get(key, 0) + row["quantity"]
+
+    rows = []
+    inventory = backend.tables.setdefault("inventory", [])
+    for (product_name, floor), quantity in totals.items():
+        row = next((r for r in inventory if r.get("product_name") == product_name and r.get("floor") == floor), None)
+        if row is None:
+            row = backend._insert_row("inventory", {"product_name": product_name, "floor": floor, "quantity": quantity})
+            row["item_id"] = row["id"]
+        else:
+            row["quantity"] += quantity
+            backend._touch("inventory", row)
+        rows.append({"id": row["id"], "item_id": row.get("item_id"), "product_name": product_name, "floor": floor, "quantity": row["quantity"]})
+
+    result = {"status": "success", "rows": rows}
+    _store_idempotency_key(backend, params["p_key"], "restock", fingerprint, result)
+    return {**result, "replayed": False}
+
+
+def _rpc_get_inventory_floors(backend, params):
+    floors = {row.get("floor") for row in backend.tables.get("inventory", [])} - {None}
+    return [{"floor": floor} for floor in sorted(floors)]
+
+
+def _rpc_get_purchase_logs_kst(backend, params):
+    logs = sorted(backend.tables.get("purchase_logs", []), key=lambda r: r.get("id", 0), reverse=True)[:20]
+    result = []
+    for log in logs:
+        created_at = datetime.fromisoformat(log["created_at"]).astimezone(KST)
+        result.append({**log, "created_at_kst": created_at.strftime("%Y-%m-%d %H:%M:%S")})
+    return result
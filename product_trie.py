@@ -0,0 +1,169 @@
+"""
+명령 입력 자동완성용 접두사 트리
+한글은 자모 단위로 분해해서 저장하므로 입력 중인 글자("촠", "과" 입력 도중의 "고")도 접두사로 일치합니다.
+  "초코파이" -> ㅊㅗㅋㅗㅍㅏㅇㅣ,  "촠" -> ㅊㅗㅋ
+"""
+
+import heapq
+import bisect
+import threading
+
+HANGUL_BASE = 0xAC00
+HANGUL_LAST = 0xD7A3
+CHOSEONG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+JUNGSEONG = ["ㅏ", "ㅐ", "ㅑ", "ㅒ", "ㅓ", "ㅔ", "ㅕ", "ㅖ", "ㅗ", "ㅗㅏ", "ㅗㅐ", "ㅗㅣ", "ㅛ", "ㅜ", "ㅜㅓ", "ㅜㅔ", "ㅜㅣ", "ㅠ", "ㅡ", "ㅡㅣ", "ㅣ"]
+JONGSEONG = ["", "ㄱ", "ㄲ", "ㄱㅅ", "ㄴ", "ㄴㅈ", "ㄴㅎ", "ㄷ", "ㄹ", "ㄹㄱ", "ㄹㅁ", "ㄹㅂ", "ㄹㅅ", "ㄹㅌ", "ㄹㅍ", "ㄹㅎ", "ㅁ", "ㅂ", "ㅂㅅ", "ㅅ", "ㅆ", "ㅇ", "ㅈ", "ㅊ", "ㅋ", "ㅌ", "ㅍ", "ㅎ"]
+# 호환용 자모로 입력된 겹모음/겹받침도 같은 방식으로 분해
+COMPAT_JAMO = {
+    "ㅘ": "ㅗㅏ", "ㅙ": "ㅗㅐ", "ㅚ": "ㅗㅣ", "ㅝ": "ㅜㅓ", "ㅞ": "ㅜㅔ", "ㅟ": "ㅜㅣ", "ㅢ": "ㅡㅣ",
+    "ㄳ": "ㄱㅅ", "ㄵ": "ㄴㅈ", "ㄶ": "ㄴㅎ", "ㄺ": "ㄹㄱ", "ㄻ": "ㄹㅁ", "ㄼ": "ㄹㅂ",
+    "ㄽ": "ㄹㅅ", "ㄾ": "ㄹㅌ", "ㄿ": "ㄹㅍ", "ㅀ": "ㄹㅎ", "ㅄ": "ㅂㅅ",
+}
+DEFAULT_LIMIT = 8
+# 노드마다 미리 골라 두는 후보 수. 이보다 많이 요청하면 그 노드 아래를 직접 탐색
+TOP_K = 8
+
+
+def to_jamo_key(text: str) -> str:
+    """검색 키: 공백 제거, 소문자, 한글 음절은 자모로 분해"""
+    key = []
+    for ch in text.lower():
+        if ch.isspace():
+            continue
+        code = ord(ch)
+        if HANGUL_BASE <= code <= HANGUL_LAST:
+            index = code - HANGUL_BASE
+            key.append(CHOSEONG[index // 588])
+            key.append(JUNGSEONG[(index % 588) // 28])
+            key.append(JONGSEONG[index % 28])
+        else:
+            key.append(COMPAT_JAMO.get(ch, ch))
+    return "".join(key)
+
+
+class _Node:
+    __slots__ = ("children", "terms", "top")
+
+    def __init__(self):
+        self.children = {}
+        self.terms = None  # 이 노드에서 끝나는 원래 문자열들
+        # 이 노드 아래(자신 포함)의 문자열 중 짧은 것부터 TOP_K개: [(자모 키 길이, 문자열), ...]
+        # 조회 때 가지를 돌지 않도록 추가/삭제 때 갱신
+        self.top = []
+
+    def offer(self, entry):
+        """entry가 TOP_K 안에 들면 순서를 지켜 추가"""
+        top = self.top
+        if len(top) >= TOP_K and entry >= top[-1]:
+            return
+        bisect.insort(top, entry)
+        del top[TOP_K:]
+
+    def rebuild_top(self, depth: int):
+        """자기 문자열과 자식들의 top에서 다시 고름 (depth: 이 노드의 자모 키 길이)"""
+        entries = [(depth, term) for term in self.terms or ()]
+        for child in self.children.values():
+            entries.extend(child.top)
+        self.top = heapq.nsmallest(TOP_K, entries)
+
+
+class ProductTrie:
+    def __init__(self):
+        # 종류("product", "floor", "command")마다 트리를 따로 두어,
+        # 명령어만 찾을 때 수천 개의 제품 가지를 돌지 않도록 함
+        self._roots = {}
+        self._kinds = {}  # 종류 -> 등록된 문자열 집합
+        self._lock = threading.Lock()
+
+    def insert(self, term: str, kind: str = "product"):
+        with self._lock:
+            terms = self._kinds.setdefault(kind, set())
+            if term in terms:
+                return
+            terms.add(term)
+            key = to_jamo_key(term)
+            entry = (len(key), term)
+            node = self._roots.setdefault(kind, _Node())
+            node.offer(entry)
+            for ch in key:
+                node = node.children.setdefault(ch, _Node())
+                node.offer(entry)
+            if node.terms is None:
+                node.terms = set()
+            node.terms.add(term)
+
+    def remove(self, term: str, kind: str = "product"):
+        with self._lock:
+            terms = self._kinds.get(kind, set())
+            if term not in terms:
+                return
+            terms.discard(term)
+            key = to_jamo_key(term)
+            path = [self._roots[kind]]
+            for ch in key:
+                path.append(path[-1].children[ch])
+            node = path[-1]
+            node.terms.discard(term)
+            if not node.terms:
+                node.terms = None
+            # 비어 버린 가지 정리
+            for depth in range(len(key), 0, -1):
+                child = path[depth]
+                if child.children or child.terms:
+                    break
+                del path[depth - 1].children[key[depth - 1]]
+                path.pop()
+            # 지운 문자열이 후보에 들어 있던 노드만 아래에서부터 다시 고름
+            entry = (len(key), term)
+            for depth in range(len(path) - 1, -1, -1):
+                if entry not in path[depth].top:
+                    break
+                path[depth].rebuild_top(depth)
+
+    def sync(self, kind: str, terms):
+        """kind에 해당하는 문자열 집합을 terms와 같게 맞춤 (바뀐 것만 추가/삭제)"""
+        terms = set(terms)
+        current = set(self._kinds.get(kind, set()))
+        for term in current - terms:
+            self.remove(term, kind)
+        for term in terms - current:
+            self.insert(term, kind)
+
+    def complete(self, prefix: str, limit: int = DEFAULT_LIMIT, kinds=None) -> list:
+        """prefix로 시작하는 문자열을 짧은 것부터 최대 limit개 반환"""
+        key = to_jamo_key(prefix)
+        if not key:
+            return []
+        with self._lock:
+            # 종류별 트리에서 각각 limit개까지 찾은 뒤 짧은 순으로 합침
+            found = []
+            for kind in sorted(self._roots if kinds is None else kinds):
+                node = self._roots.get(kind)
+                for ch in key:
+                    if node is None:
+                        break
+                    node = node.children.get(ch)
+                if node is not None:
+                    found.extend(node.top[:limit] if limit <= TOP_K else self._nearest(node, len(key), limit))
+            found.sort()
+
+            results = []
+            for _, term in found:
+                if term not in results:
+                    results.append(term)
+            return results[:limit]
+
+    @staticmethod
+    def _nearest(node: _Node, depth: int, limit: int) -> list:
+        """너비 우선 탐색: 가까운 후보부터 (자모 키 길이, 문자열)을 모으고 limit개가 차면 즉시 중단"""
+        found = []
+        frontier = [node]
+        while frontier and len(found) < limit:
+            next_frontier = []
+            for current in frontier:
+                if current.terms:
+                    found.extend((depth, term) for term in sorted(current.terms))
+                next_frontier.extend(current.children.values())
+            frontier = next_frontier
+            depth += 1
+        return found
@@ -0,0 +1,112 @@
+"""
+Supabase 로그인 세션(JWT) 백그라운드 갱신
+만료 REFRESH_MARGIN_SECONDS초 전에 refresh token으로 세션을 갱신하고,
+그래도 요청 도중 만료 오류가 나면 call()이 즉시 갱신 후 한 번 재시도합니다.
+"""
+
+import time
+import threading
+from instrumentation import metrics
+
+REFRESH_MARGIN_SECONDS = 120
+RETRY_DELAY_SECONDS = 30
+MIN_DELAY_SECONDS = 5
+
+
+def is_session_expired(error: Exception) -> bool:
+    """PostgREST/GoTrue의 JWT 만료 오류인지 판별"""
+    code = getattr(error, "code", None)
+    if code == "PGRST301":
+        return True
+    message = str(error).lower()
+    return "jwt expired" in message or "pgrst301" in message or "token is expired" in message
+
+
+class SessionRefresher:
+    def __init__(self, auth, session, margin: float = REFRESH_MARGIN_SECONDS, on_refreshed=None, on_failed=None):
+        """
+        auth: supabase.auth (refresh_session을 제공하는 객체)
+        session: 로그인 응답의 session (access_token, refresh_token, expires_at)
+        on_refreshed(session), on_failed(error): 백그라운드 스레드에서 호출됨
+        """
+        self.auth = auth
+        self.session = session
+        self.margin = margin
+        self.on_refreshed = on_refreshed
+        self.on_failed = on_failed
+        self._lock = threading.Lock()
+        self._timer = None
+        self._stopped = False
+
+    def start(self):
+        self._stopped = False
+        self._schedule(self._seconds_until_refresh())
+
+    def stop(self):
+        self._stopped = True
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def _seconds_until_refresh(self) -> float:
+        expires_at = getattr(self.session, "expires_at", None)
+        if not expires_at:
+            expires_in = getattr(self.session, "expires_in", None) or 3600
+            expires_at = time.time() + expires_in
+        return max(expires_at - time.time() - self.margin, MIN_DELAY_SECONDS)
+
+    def _schedule(self, delay: float):
+        if self._stopped:
+            return
+        if self._timer:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self):
+        try:
+            self.refresh()
+        except Exception:
+            # 네트워크 오류 등은 잠시 후 다시 시도. 만료 전이면 기존 토큰으로 계속 동작
+            self._schedule(RETRY_DELAY_SECONDS)
+
+    def refresh(self, stale_access_token: str = None):
+        """
+        세션을 갱신하고 다음 갱신을 예약
+        stale_access_token을 주면 이미 다른 스레드가 갱신한 경우 건너뜀
+        """
+        with self._lock:
+            if stale_access_token and self.session.access_token != stale_access_token:
+                return self.session
+
+            started = time.perf_counter()
+            try:
+                response = self.auth.refresh_session(self.session.refresh_token)
+            except Exception as e:
+                metrics.incr("session.refresh_failed")
+                if self.on_failed:
+                    self.on_failed(e)
+                raise
+            finally:
+                metrics.observe("session.refresh", time.perf_counter() - started)
+
+            self.session = response.session
+            metrics.incr("session.refreshed")
+
+        if self.on_refreshed:
+            self.on_refreshed(self.session)
+        self._schedule(self._seconds_until_refresh())
+        return self.session
+
+    def call(self, fn, *args, **kwargs):
+        """fn을 실행하고, 세션 만료로 실패하면 세션을 갱신한 뒤 한 번 재시도"""
+        access_token = self.session.access_token
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if not is_session_expired(e):
+                raise
+            metrics.incr("session.expired_retries")
+            self.refresh(stale_access_token=access_token)
+            return fn(*args, **kwargs)
@@ -0,0 +1,170 @@
+"""
+월별 간식 정산 보고서
+purchase_logs를 기간으로 걸러 (created_at, id) 기준 키셋 페이지네이션으로 나누어 읽고, 읽는 즉시 직원/제품/층별로 합산합니다.
+페이지는 합산 후 버리므로 로그가 아무리 많아도 메모리는 직원/제품/층 수에만 비례합니다.
+결과는 bulk_inventory.write_table_file로 CSV/Excel로 저장합니다.
+"""
+
+import re
+import time
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+import bulk_inventory
+from instrumentation import metrics
+
+KST = timezone(timedelta(hours=9))
+REPORT_PAGE_SIZE = 1000
+REPORT_COLUMNS = ["구분", "항목", "이름", "건수", "수량"]
+UNKNOWN_FLOOR = "알 수 없음"  # 이미 삭제된 품목의 구매 기록
+
+
+def month_range(month: str, now: datetime = None):
+    """
+    "YYYY-MM", "this_month", "last_month"를 KST 기준 [시작, 끝) datetime 쌍으로 변환
+    """
+    now = (now or datetime.now(KST)).astimezone(KST)
+    if month in (None, "", "last_month"):
+        first_of_this = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        start = (first_of_this - timedelta(days=1)).replace(day=1)
+    elif month == "this_month":
+        start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    else:
+        match = re.fullmatch(r"(\d{4})-(\d{1,2})", str(month).strip())
+        if not match or not 1 <= int(match.group(2)) <= 12:
+            raise ValueError(f"정산 월 형식이 올바르지 않습니다: {month} (예: 2026-09)")
+        start = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=KST)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def date_range(start: str, end: str):
+    """"YYYY-MM-DD" 시작일/종료일(포함)을 KST 기준 [시작, 끝) datetime 쌍으로 변환"""
+    try:
+        start_at = datetime.strptime(start, "%Y-%m-%d").replace(tzinfo=KST)
+        end_at = datetime.strptime(end, "%Y-%m-%d").replace(tzinfo=KST) + timedelta(days=1)
+    except (TypeError, ValueError):
+        raise ValueError(f"기간 형식이 올바르지 않습니다: {start} ~ {end} (예: 2026-09-01)")
+    if end_at <= start_at:
+        raise ValueError("종료일이 시작일보다 빠릅니다.")
+    return start_at, end_at
+
+
+def resolve_period(payload: dict):
+    """정산 작업 payload에서 기간을 구함. start/end가 있으면 우선, 없으면 month"""
+    if payload.get("start") and payload.get("end"):
+        return date_range(payload["start"], payload["end"])
+    return month_range(payload.get("month"))
+
+
+def iter_purchase_log_pages(supabase, start: datetime, end: datetime, page_size: int = REPORT_PAGE_SIZE):
+    """
+    기간 안의 구매 로그를 (created_at, id) 순서로 page_size개씩 yield
+    OFFSET 없이 마지막 (created_at, id) 다음부터 조회하므로 query.md의 (created_at, id) 인덱스를 정렬 없이 그대로 탐색함
+    """
+    last = None
+    while True:
+        query = (
+            supabase.table("purchase_logs")
+            .select("id, employee_id, item_id, product_name, quantity, created_at")
+            .gte("created_at", start.astimezone(timezone.utc).isoformat())
+            .lt("created_at", end.astimezone(timezone.utc).isoformat())
+        )
+        if last is not None:
+            last_created_at, last_id = last
+            # (created_at, id) > (마지막 created_at, 마지막 id). gte는 인덱스 탐색 시작점을 마지막 시각으로 당김
+            query = query.gte("created_at", last_created_at).or_(
+                f'created_at.gt."{last_created_at}",and(created_at.eq."{last_created_at}",id.gt.{last_id})'
+            )
+        page = query.order("created_at").order("id").limit(page_size).execute().data
+        if not page:
+            return
+        metrics.incr("settlement.pages")
+        yield page
+        if len(page) < page_size:
+            return
+        last = (page[-1]["created_at"], page[-1]["id"])
+
+
+class SettlementAggregator:
+    """구매 로그를 한 행씩 받아 직원/제품/층별 건수와 수량을 누적"""
+
+    def __init__(self, floor_by_item: dict = None):
+        self.floor_by_item = floor_by_item or {}
+        self.by_employee = {}
+        self.by_product = {}
+        self.by_floor = {}
+        self.total = {"count": 0, "quantity": 0}
+
+    @staticmethod
+    def _add(bucket: dict, key, quantity: int):
+        entry = bucket.get(key)
+        if entry is None:
+            entry = bucket[key] = {"count": 0, "quantity": 0}
+        entry["count"] += 1
+        entry["quantity"] += quantity
+
+    def add(self, log: dict):
+        quantity = int(log.get("quantity") or 0)
+        item_id = log.get("item_id")
+        floor = UNKNOWN_FLOOR if item_id is None else self.floor_by_item.get(item_id, UNKNOWN_FLOOR)
+        self._add(self.by_employee, log.get("employee_id"), quantity)
+        self._add(self.by_product, log.get("product_name"), quantity)
+        self._add(self.by_floor, floor, quantity)
+        self.total["count"] += 1
+        self.total["quantity"] += quantity
+
+
+def build_settlement(supabase, start: datetime, end: datetime, page_size: int = REPORT_PAGE_SIZE) -> dict:
+    """
+    기간의 정산 결과를 계산
+    반환: {"start", "end", "by_employee", "by_product", "by_floor", "total", "names", "elapsed"}
+    """
+    started = time.perf_counter()
+    inventory = supabase.table("inventory").select("item_id, floor").execute().data or []
+    # item_id가 없는 행은 구매 로그와 이어지지 않으므로 제외 (그런 로그는 UNKNOWN_FLOOR로 집계)
+    aggregator = SettlementAggregator({row["item_id"]: row["floor"] for row in inventory if row.get("item_id") is not None})
+    for page in iter_purchase_log_pages(supabase, start, end, page_size):
+        for log in page:
+            aggregator.add(log)
+
+    employees = supabase.table("employees").select("employee_id, name").execute().data or []
+    elapsed = time.perf_counter() - started
+    metrics.observe("settlement.build", elapsed)
+    return {
+        "start": start,
+        "end": end,
+        "by_employee": aggregator.by_employee,
+        "by_product": aggregator.by_product,
+        "by_floor": aggregator.by_floor,
+        "total": aggregator.total,
+        "names": {e["employee_id"]: e.get("name", "") for e in employees},
+        "elapsed": elapsed,
+    }
+
+
+def period_label(report: dict) -> str:
+    last_day = report["end"] - timedelta(days=1)
+    return f"{report['start']:%Y-%m-%d} ~ {last_day:%Y-%m-%d}"
+
+
+def settlement_rows(report: dict) -> list:
+    """파일로 저장할 행 목록 (직원 -> 제품 -> 층 -> 합계 순, 각 구분 안에서는 수량 많은 순)"""
+    def ordered(bucket):
+        return sorted(bucket.items(), key=lambda item: (-item[1]["quantity"], str(item[0])))
+
+    rows = []
+    for employee_id, entry in ordered(report["by_employee"]):
+        rows.append(["직원", employee_id, report["names"].get(employee_id, ""), entry["count"], entry["quantity"]])
+    for product_name, entry in ordered(report["by_product"]):
+        rows.append(["제품", product_name, "", entry["count"], entry["quantity"]])
+    for floor, entry in ordered(report["by_floor"]):
+        rows.append(["층", floor if floor == UNKNOWN_FLOOR else f"{floor}층", "", entry["count"], entry["quantity"]])
+    rows.append(["합계", period_label(report), "", report["total"]["count"], report["total"]["quantity"]])
+    return rows
+
+
+def write_settlement(report: dict, path: str) -> int:
+    """정산 결과를 CSV/Excel로 저장하고 행 수를 반환"""
+    df = pd.DataFrame(settlement_rows(report), columns=REPORT_COLUMNS)
+    bulk_inventory.write_table_file(df, path)
+    return len(df)
@@ -0,0 +1,105 @@
+"""
+재고 부족 알림
+제품/층별 기준 수량을 두고, 재고가 바뀔 때마다 해당 품목 하나만 다시 평가합니다.
+기준 이하로 "떨어지는 순간"에만 알림을 만들고, 다시 채워지면 알림 상태를 해제합니다.
+"""
+
+import os
+import time
+import tomllib
+import threading
+
+DEFAULT_THRESHOLD = 3
+
+
+class LowStockMonitor:
+    def __init__(self, thresholds: dict = None, default_threshold: int = DEFAULT_THRESHOLD, log_path: str = None):
+        """
+        thresholds: {(제품명, 층): 기준} 또는 {(제품명, None): 기준 (모든 층)}
+        log_path: 지정하면 알림을 탭으로 구분된 한 줄씩 추가 기록
+        """
+        self.thresholds = thresholds or {}
+        self.default_threshold = default_threshold
+        self.log_path = log_path
+        self._low = {}  # (제품명, 층) -> 현재 기준 이하인지
+        self._lock = threading.Lock()
+
+    def threshold_for(self, product_name: str, floor) -> int:
+        return self.thresholds.get((product_name, floor), self.thresholds.get((product_name, None), self.default_threshold))
+
+    def is_low(self, product_name: str, floor) -> bool:
+        return self._low.get((product_name, floor), False)
+
+    def seed(self, rows: list, floor=None) -> list:
+        """
+        테이블을 불러올 때 재고 행들을 반영하고 새로 생긴 알림 목록을 반환
+        처음 보는 품목은 현재 상태만 기록하고, 이미 추적 중인 품목은 observe와 같이 평가하므로
+        다른 키오스크에서 기준 이하로 떨어진 품목도 새로 고침 때 알림이 만들어짐
+        """
+        alerts = []
+        with self._lock:
+            for row in rows:
+                key = (row["product_name"], row.get("floor", floor))
+                if key not in self._low:
+                    self._low[key] = row["quantity"] <= self.threshold_for(*key)
+                    continue
+                alert = self._transition(key, row["quantity"])
+                if alert:
+                    alerts.append(alert)
+        for alert in alerts:
+            self._write_log(alert)
+        return alerts
+
+    def observe(self, product_name: str, floor, quantity):
+        """
+        품목 하나의 새 수량을 반영. 기준 이하로 새로 떨어졌으면 알림 dict를, 아니면 None을 반환
+        quantity가 None이면 삭제된 품목으로 보고 상태를 지움
+        """
+        key = (product_name, floor)
+        with self._lock:
+            if quantity is None:
+                self._low.pop(key, None)
+                return None
+            alert = self._transition(key, quantity)
+
+        if alert:
+            self._write_log(alert)
+        return alert
+
+    def _transition(self, key, quantity: int):
+        """잠금 안에서 호출. 상태를 바꾸고, 기준 이하로 새로 떨어졌으면 알림 dict를 반환"""
+        threshold = self.threshold_for(*key)
+        was_low = self._low.get(key, False)
+        now_low = quantity <= threshold
+        self._low[key] = now_low
+        if not now_low or was_low:
+            return None
+        return {"product_name": key[0], "floor": key[1], "quantity": quantity, "threshold": threshold}
+
+    def _write_log(self, alert: dict):
+        if not self.log_path:
+            return
+        try:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')}\t{alert['floor']}층\t{alert['product_name']}\t{alert['quantity']}\t{alert['threshold']}\n")
+        except OSError:
+            # 알림 기록 실패가 재고 처리를 막지 않도록 무시
+            pass
+
+
+def load_monitor(config_path: str, log_dir: str = None) -> LowStockMonitor:
+    """alerts.toml을 읽어 LowStockMonitor를 생성. 파일이 없으면 기본값 사용"""
+    if not os.path.exists(config_path):
+        return LowStockMonitor()
+
+    with open(config_path, "rb") as f:
+        cfg = tomllib.load(f)
+
+    thresholds = {}
+    for entry in cfg.get("thresholds", []):
+        thresholds[(entry["product_name"], entry.get("floor"))] = int(entry["threshold"])
+
+    log_path = cfg.get("alerts_log") or None
+    if log_path and log_dir and not os.path.isabs(log_path):
+        log_path = os.path.join(log_dir, log_path)
+    return LowStockMonitor(thresholds, int(cfg.get("default_threshold", DEFAULT_THRESHOLD)), log_path)